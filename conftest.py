@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cut_thumbnails_inline(settings):
+    # Потоки пула дописывали бы миниатюры во временный MEDIA_ROOT,
+    # который тест в это время удаляет.
+    settings.THUMBNAIL_WORKERS = 0
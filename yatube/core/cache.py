@@ -0,0 +1,191 @@
+import contextvars
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+
+KEY_PREFIX = 'generation'
+
+# Защита от одновременного пересчёта (см. get_or_compute).
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+WAIT_STEP = 0.05
+EARLY_REFRESH_BETA = 1.0
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def generations(*scopes):
+    """Возвращает текущие поколения областей кеша.
+
+    Отсутствующее поколение заводится от текущего времени, а не с нуля:
+    после вытеснения ключа из кеша номер не повторит уже выданный,
+    и старые фрагменты не оживут.
+    """
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сдвигает поколения: все фрагменты этих областей устаревают."""
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            cache.add(_key(scope), time.time_ns(), timeout=None)
+
+
+def cache_version(*scopes):
+    """Строка для ключа {% cache %}, меняющаяся при любом bump()."""
+    return '-'.join(str(generation) for generation in generations(*scopes))
+
+
+def cache_shared_page(*scopes):
+    """Помечает view для PageCacheMiddleware.
+
+    Страница кешируется целиком по адресу с query string и поколениям
+    scopes, одна на всех пользователей: личные фрагменты в ней выводятся
+    тегом {% hole %}. Запись в этих областях сбрасывает страницу.
+    Область может быть функцией от аргументов адреса (см. page_scopes).
+    """
+    def mark(view):
+        view.shared_page_scopes = scopes
+        return view
+    return mark
+
+
+def page_scopes(scopes, kwargs):
+    """Области конкретной страницы: функции вызываются с аргументами
+    адреса, так что, например, страница группы зависит только от неё."""
+    return [scope(**kwargs) if callable(scope) else scope
+            for scope in scopes]
+
+
+def page_key(request, scopes, prefix='page'):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{prefix}:{request.method}:{path}:{cache_version(*scopes)}'
+
+
+def page_etag(request, scopes):
+    # Личные фрагменты у каждого свои, поэтому пользователь входит в тег.
+    # Форма комментария несёт токен CSRF, а он меняется при входе: иначе
+    # 304 оставил бы браузеру страницу со старым токеном. get_token()
+    # заводит токен, если его ещё нет, чтобы тег совпал со страницей.
+    token = ''
+    if request.user.is_authenticated:
+        get_token(request)
+        token = request.META['CSRF_COOKIE']
+    source = (f'{request.get_full_path()}:{request.user.pk}:{token}:'
+              f'{cache_version(*scopes)}')
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+class StaleGuard:
+    served = False
+
+
+_guard = contextvars.ContextVar('stale_guard', default=None)
+
+
+def _mark_stale():
+    guard = _guard.get()
+    if guard is not None:
+        guard.served = True
+
+
+@contextmanager
+def stale_guard():
+    """Следит, отдал ли get_or_compute внутри блока значение прежнего
+    поколения. Собранное из такого значения кешировать нельзя: оно
+    останется устаревшим до конца срока под ключом нового поколения.
+    """
+    guard = StaleGuard()
+    token = _guard.set(guard)
+    try:
+        yield guard
+    finally:
+        _guard.reset(token)
+        if guard.served:
+            _mark_stale()
+
+
+def _should_refresh(expires, delta, beta):
+    # Вероятностный ранний пересчёт (XFetch): чем ближе срок и чем дольше
+    # считалось значение, тем вероятнее один из запросов обновит его
+    # заранее, и срок не истечёт у всех разом.
+    return time.time() - delta * beta * math.log(1 - random.random()) >= (
+        expires)
+
+
+def _compute(key, compute, timeout, stale_key=None):
+    start = time.time()
+    with stale_guard() as guard:
+        value = compute()
+    if guard.served:
+        return value
+    delta = time.time() - start
+    expires = math.inf if timeout is None else time.time() + timeout
+    # В бэкенде запись живёт вдвое дольше своего срока: устаревшее значение
+    # отдаётся, пока один из процессов считает новое.
+    backend_timeout = None if timeout is None else timeout * 2
+    cache.set(key, (value, expires, delta), backend_timeout)
+    if stale_key is not None:
+        cache.set(stale_key, value, backend_timeout)
+    return value
+
+
+def peek(key):
+    """Значение, сохранённое get_or_compute, без пересчёта и проверки срока."""
+    entry = cache.get(key)
+    return None if entry is None else entry[0]
+
+
+def get_or_compute(key, compute, timeout, beta=EARLY_REFRESH_BETA,
+                   stale_key=None):
+    """Кеширует compute() под key так, чтобы пересчёт шёл в одном потоке.
+
+    Пересчёт получает тот, кто взял блокировку в кеше; остальные отдают
+    устаревшее значение, а если его нет, ждут до LOCK_WAIT секунд.
+
+    Если в key входит поколение, после bump() старого значения под новым
+    ключом нет. Тогда нужен stale_key — тот же ключ без поколения: под ним
+    хранится последнее посчитанное значение, и его отдают, пока владелец
+    блокировки считает новое. Об этом узнаёт охватывающий stale_guard(),
+    а значения, собранные из прежнего поколения, не кешируются.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if not _should_refresh(expires, delta, beta):
+            return value
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, LOCK_TIMEOUT):
+        try:
+            return _compute(key, compute, timeout, stale_key)
+        finally:
+            cache.delete(lock)
+    if entry is not None:
+        return entry[0]
+    if stale_key is not None:
+        stale = cache.get(stale_key)
+        if stale is not None:
+            _mark_stale()
+            return stale
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return _compute(key, compute, timeout, stale_key)
@@ -0,0 +1,44 @@
+"""Дырки в закешированных страницах.
+
+Общее тело страницы кешируется одно на всех, а небольшие фрагменты,
+зависящие от пользователя (шапка, кнопки, формы), на их месте остаются
+метками и дорисовываются на каждый запрос через зарегистрированные
+функции. Функция получает запрос и простые параметры из метки и
+возвращает HTML фрагмента.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+HOLES = {}
+MARKER = re.compile(r'<!--hole:(?P<name>[\w-]+):(?P<params>[\w=-]*)-->')
+
+
+def hole(name):
+    def register(func):
+        HOLES[name] = func
+        return func
+    return register
+
+
+def render(request, name, **params):
+    return HOLES[name](request, **params)
+
+
+def punch(name, **params):
+    encoded = base64.urlsafe_b64encode(json.dumps(params).encode())
+    return f'<!--hole:{name}:{encoded.decode()}-->'
+
+
+def fill(request, content):
+    def replace(match):
+        params = json.loads(base64.urlsafe_b64decode(match['params']))
+        return render(request, match['name'], **params)
+    return MARKER.sub(replace, content)
+
+
+@hole('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
@@ -0,0 +1,122 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+
+from . import holes
+from .cache import page_etag, page_key, page_scopes, stale_guard
+from .queries import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class QueryInspectorMiddleware:
+    """В DEBUG считает SQL-запросы запроса и ищет повторы вида N+1.
+
+    Итог отдаётся в заголовках X-Query-Count и X-Query-Repeats,
+    а повторяющиеся формы запросов пишутся в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+        with QueryRecorder().record() as recorder:
+            response = self.get_response(request)
+        repeated = recorder.repeated()
+        response['X-Query-Count'] = len(recorder.statements)
+        response['X-Query-Repeats'] = len(repeated)
+        if repeated:
+            logger.warning('N+1 queries on %s:\n%s', request.path,
+                           recorder.report())
+        return response
+
+
+class PageCacheMiddleware:
+    """Отдаёт страницы, помеченные cache_shared_page, из общего кеша.
+
+    Общее тело хранится с метками {% hole %}, и на каждый запрос в него
+    дорисовываются только личные фрагменты. Анонимным читателям, у которых
+    эти фрагменты одинаковы, готовая страница кешируется ещё и целиком:
+    такое попадание не трогает ни базу, ни шаблоны.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def resolve(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not hasattr(match.func, 'shared_page_scopes'):
+            return None
+        return match
+
+    def __call__(self, request):
+        match = self.resolve(request)
+        if match is None:
+            return self.get_response(request)
+        scopes = page_scopes(match.func.shared_page_scopes, match.kwargs)
+        anonymous = not request.user.is_authenticated
+        anonymous_key = page_key(request, scopes, prefix='anonymous-page')
+        if anonymous:
+            response = cache.get(anonymous_key)
+            if response is not None:
+                response = get_conditional_response(
+                    request, etag=response.get('ETag'), response=response)
+                response['X-Page-Cache'] = 'hit'
+                return response
+        key = page_key(request, scopes)
+        page = cache.get(key)
+        if page is None:
+            response = self.render(request, key)
+        else:
+            request.resolver_match = match
+            response = self.fill(request, page, scopes)
+        if (anonymous and response.status_code == 200
+                and not response.cookies
+                and not getattr(request, 'served_stale', False)):
+            cache.set(anonymous_key, response,
+                      settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def render(self, request, key):
+        request.punch_holes = True
+        with stale_guard() as guard:
+            response = self.get_response(request)
+        # Пока новое поколение фрагмента считает другой процесс, страница
+        # собрана из прежнего и в кеш не идёт, иначе новое поколение
+        # надолго останется без свежих записей.
+        request.served_stale = guard.served
+        if response.streaming or response.status_code == 304:
+            return response
+        content = response.content.decode(response.charset)
+        if (response.status_code == 200 and not response.cookies
+                and not request.served_stale):
+            cache.set(key, {
+                'content': content,
+                'content_type': response['Content-Type'],
+            }, settings.PAGE_CACHE_TIMEOUT)
+            response['X-Page-Cache'] = 'miss'
+        elif request.served_stale:
+            response['X-Page-Cache'] = 'stale'
+        response.content = holes.fill(request, content)
+        return response
+
+    def fill(self, request, page, scopes):
+        etag = quote_etag(page_etag(request, scopes))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(holes.fill(request, page['content']),
+                                    content_type=page['content_type'])
+        response['ETag'] = etag
+        response['X-Page-Cache'] = 'hit'
+        return response
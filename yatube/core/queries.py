@@ -0,0 +1,67 @@
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PLACEHOLDERS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+
+def normalize(sql):
+    """Форма запроса: литералы и списки параметров заменены на %s."""
+    sql = PLACEHOLDERS.sub('%s', sql)
+    return PLACEHOLDER_LISTS.sub('(%s, ...)', sql)
+
+
+class QueryRecorder:
+    """Записывает SQL всех подключений, пока активен как execute_wrapper."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def repeated(self, threshold=None):
+        """Формы запросов, выполненные не меньше threshold раз (N+1)."""
+        if threshold is None:
+            threshold = settings.QUERY_REPEAT_THRESHOLD
+        shapes = Counter(normalize(sql) for sql in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common()
+                if count >= threshold]
+
+    def report(self, threshold=None):
+        return '\n'.join(f'{count}x {shape}'
+                         for shape, count in self.repeated(threshold))
+
+
+@contextmanager
+def assert_query_budget(budget, threshold=None):
+    """Проваливает тест, если в блоке выполнено больше budget запросов
+    или одна и та же форма запроса повторилась threshold раз.
+
+    Работает и в TestCase, и в pytest:
+
+        with assert_query_budget(5):
+            client.get('/')
+    """
+    with QueryRecorder().record() as recorder:
+        yield recorder
+    count = len(recorder.statements)
+    assert count <= budget, (
+        f'Выполнено {count} запросов при бюджете {budget}:\n'
+        + '\n'.join(recorder.statements)
+    )
+    assert not recorder.repeated(threshold), (
+        f'Повторяющиеся запросы (N+1):\n{recorder.report(threshold)}'
+    )
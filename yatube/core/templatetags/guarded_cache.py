@@ -0,0 +1,65 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core.cache import cache_version, get_or_compute
+
+register = template.Library()
+
+
+class GuardedCacheNode(CacheNode):
+    def __init__(self, *args, version=None):
+        super().__init__(*args)
+        self.version = version
+
+    def render(self, context):
+        timeout = self.expire_time_var.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        stale_key = None
+        if self.version is not None:
+            stale_key = key
+            key = make_template_fragment_key(
+                self.fragment_name,
+                vary_on + [self.version.resolve(context)])
+        return get_or_compute(key, lambda: self.nodelist.render(context),
+                              None if timeout is None else int(timeout),
+                              stale_key=stale_key)
+
+
+@register.tag('guarded_cache')
+def do_guarded_cache(parser, token):
+    """Как {% cache %}, но через core.cache.get_or_compute: истёкший
+    фрагмент пересчитывает один запрос, остальные отдают старый.
+
+        {% guarded_cache timeout name [vary_on ...] [version=...] %}
+            ...
+        {% endguarded_cache %}
+
+    version — поколение кеша: после его смены, пока новый фрагмент
+    считается, остальные запросы отдают фрагмент прежнего поколения.
+    """
+    nodelist = parser.parse(('endguarded_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    version = None
+    if tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.')
+    return GuardedCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        None,
+        version=version,
+    )
+
+
+@register.filter
+def generation(pk, scope):
+    """Поколение области объекта для ключа фрагмента:
+    {{ post.author_id|generation:'user' }} — поколение user:<id>."""
+    return cache_version(f'{scope}:{pk}')
@@ -0,0 +1,129 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import TestCase
+from django.template import Context, Template
+
+from core.cache import (bump, cache_version, generations, get_or_compute,
+                        stale_guard, LOCK_WAIT)
+
+
+class GenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_only_its_scope(self):
+        """bump меняет версию своей области и не трогает чужие"""
+        group, author = cache_version('group:1'), cache_version('author:1')
+        bump('group:1')
+        self.assertNotEqual(cache_version('group:1'), group)
+        self.assertEqual(cache_version('author:1'), author)
+
+    def test_evicted_generation_is_not_reused(self):
+        """После вытеснения поколение не возвращается к старому номеру"""
+        first, = generations('posts')
+        bump('posts')
+        cache.clear()
+        second, = generations('posts')
+        self.assertGreater(second, first + 1)
+
+
+class GetOrComputeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        """Свежее значение берётся из кеша без пересчёта"""
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой процесс держит блокировку, отдаётся старое значение"""
+        cache.set('key', ('старое', time.time() - 1, 0))
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'старое')
+        cache.delete('key:lock')
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+
+    def test_previous_generation_served_while_locked(self):
+        """После смены поколения отдаётся значение прежнего, без ожидания"""
+        get_or_compute('key:1', self.compute, 60, stale_key='key')
+        cache.add('key:2:lock', 1)
+        with mock.patch('core.cache.time.sleep') as sleep:
+            self.assertEqual(
+                get_or_compute('key:2', self.compute, 60, stale_key='key'), 1)
+        sleep.assert_not_called()
+        self.assertEqual(self.calls, 1)
+
+    def test_waits_for_lock_holder(self):
+        """Без старого значения запрос ждёт результата владельца блокировки"""
+        cache.add('key:lock', 1)
+        with mock.patch('core.cache.time.sleep',
+                        side_effect=lambda _: cache.set(
+                            'key', ('готово', float('inf'), 0))):
+            self.assertEqual(get_or_compute('key', self.compute, 60),
+                             'готово')
+        self.assertEqual(self.calls, 0)
+
+    def test_gives_up_waiting(self):
+        """Если блокировку не отпустили, значение считается самостоятельно"""
+        cache.add('key:lock', 1)
+        with mock.patch('core.cache.time.sleep'), \
+                mock.patch('core.cache.time.monotonic',
+                           side_effect=[0, 1, LOCK_WAIT + 1]):
+            self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+
+    def test_early_refresh(self):
+        """Дорогое значение пересчитывается заранее, до истечения срока"""
+        cache.set('key', ('старое', time.time() + 1, 1000))
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+
+    def test_guarded_cache_tag(self):
+        """Тег guarded_cache кеширует фрагмент как обычный cache"""
+        template = Template('{% load guarded_cache %}'
+                            '{% guarded_cache 60 fragment key %}'
+                            '{{ value }}{% endguarded_cache %}')
+        self.assertEqual(template.render(Context({'key': 1, 'value': 'а'})),
+                         'а')
+        self.assertEqual(template.render(Context({'key': 1, 'value': 'б'})),
+                         'а')
+
+    def test_guarded_cache_version(self):
+        """Новое поколение фрагмента считается заново, пока его считает
+        другой запрос, отдаётся фрагмент прежнего поколения"""
+        template = Template('{% load guarded_cache %}'
+                            '{% guarded_cache 60 fragment version=version %}'
+                            '{{ value }}{% endguarded_cache %}')
+        self.assertEqual(
+            template.render(Context({'version': 1, 'value': 'а'})), 'а')
+        self.assertEqual(
+            template.render(Context({'version': 2, 'value': 'б'})), 'б')
+        with mock.patch('core.cache.cache.add', return_value=False):
+            self.assertEqual(
+                template.render(Context({'version': 3, 'value': 'в'})), 'б')
+
+    def test_outer_fragment_not_cached_with_stale_inner(self):
+        """Фрагмент, внутри которого отдан прежний, сам не кешируется"""
+        template = Template('{% load guarded_cache %}'
+                            '{% guarded_cache 60 outer version %}'
+                            '{% guarded_cache 60 inner version=version %}'
+                            '{{ value }}{% endguarded_cache %}'
+                            '{% endguarded_cache %}')
+        template.render(Context({'version': 1, 'value': 'а'}))
+        inner_lock = make_template_fragment_key('inner', [2]) + ':lock'
+        cache.add(inner_lock, 1)
+        with stale_guard() as guard:
+            self.assertEqual(
+                template.render(Context({'version': 2, 'value': 'б'})), 'а')
+        self.assertTrue(guard.served)
+        cache.delete(inner_lock)
+        self.assertEqual(
+            template.render(Context({'version': 2, 'value': 'б'})), 'б')
@@ -0,0 +1,195 @@
+import warnings
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='page-slug',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_hit_skips_database(self):
+        """Повторный анонимный запрос отдаётся из кеша без запросов к БД"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertEqual(first['X-Page-Cache'], 'miss')
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(second['X-Page-Cache'], 'hit')
+                self.assertEqual(first.content, second.content)
+
+    def test_query_string_is_part_of_key(self):
+        """Разные страницы ленты кешируются отдельно"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.guest_client.get(f'{url}?page=2')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+
+    def test_logged_in_users_get_own_fragments(self):
+        """Общая страница дорисовывается личными фрагментами пользователя"""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.guest_client.get(url)
+        client = Client()
+        client.force_login(reader)
+        response = client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Отписаться')
+        client.force_login(self.author)
+        response = client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: author')
+        self.assertNotContains(response, 'Отписаться')
+        self.assertNotContains(response, 'Подписаться')
+
+    def test_post_page_fragments(self):
+        """Форма комментария и ссылка на правку видны только своим"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        client = Client()
+        client.force_login(self.author)
+        client.get(url)
+        response = client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Редактировать запись')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Редактировать запись')
+        self.assertNotContains(response, 'Добавить комментарий')
+        self.assertNotContains(response, '<!--hole:')
+
+    def test_writes_invalidate_pages(self):
+        """Посты, комментарии, группы и подписки сбрасывают страницы"""
+        reader = User.objects.create_user(username='reader')
+        writes = (
+            lambda: Post.objects.create(author=self.author, text='Новый',
+                                        group=self.group),
+            lambda: Comment.objects.create(post=self.post, author=reader,
+                                           text='Комментарий'),
+            lambda: Group.objects.get(pk=self.group.pk).save(),
+        )
+        for write in writes:
+            for url in self.urls():
+                self.guest_client.get(url)
+            write()
+            for url in self.urls():
+                with self.subTest(url=url):
+                    response = self.guest_client.get(url)
+                    self.assertEqual(response['X-Page-Cache'], 'miss')
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.guest_client.get(url)
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertContains(self.guest_client.get(url), 'Подписчиков: 1')
+
+    def test_writes_keep_unrelated_pages(self):
+        """Пост без группы и чужая подписка не сбрасывают страницу группы"""
+        other = User.objects.create_user(username='other')
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        Post.objects.create(author=other, text='Пост без группы')
+        Follow.objects.create(user=other, author=self.author)
+        self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_stale_fragment_not_cached(self):
+        """Страница из фрагмента прежнего поколения не кешируется:
+        следующий запрос показывает новый пост"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        add = cache.add
+
+        def locked(key, *args, **kwargs):
+            if key.startswith('template.cache.index_page') and key.endswith(
+                    ':lock'):
+                return False
+            return add(key, *args, **kwargs)
+
+        with mock.patch('core.cache.cache.add', side_effect=locked):
+            response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        self.assertNotContains(response, 'Свежий пост')
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Свежий пост')
+
+    def test_author_name_change_invalidates_cards(self):
+        """Новое имя автора видно в лентах и гостям, и вошедшим"""
+        client = Client()
+        client.force_login(User.objects.create_user(username='reader'))
+        urls = self.urls()[:3]
+        for url in urls:
+            self.guest_client.get(url)
+            client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name, author.last_name = 'Лев', 'Толстой'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Лев Толстой')
+                self.assertContains(client.get(url), 'Лев Толстой')
+
+    def test_login_keeps_pages(self):
+        """Вход пользователя не сбрасывает страницы"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.set_password('password')
+        author.save()
+        Client().login(username='author', password='password')
+        self.assertEqual(self.guest_client.get(url)['X-Page-Cache'], 'hit')
+
+    def test_rename_drops_old_profile_page(self):
+        """Старый адрес профиля после смены имени не отдаётся из кеша"""
+        old_url = reverse('posts:profile', kwargs={'username': 'author'})
+        post_url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.id})
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=commenter,
+                               text='Комментарий')
+        self.guest_client.get(old_url)
+        self.guest_client.get(post_url)
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'writer'
+        author.save()
+        commenter.username = 'critic'
+        commenter.save()
+        self.assertEqual(self.guest_client.get(old_url).status_code, 404)
+        self.assertContains(self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'writer'})), 'Пост')
+        self.assertContains(self.guest_client.get(post_url), 'critic')
+
+    def test_username_key_is_hashed(self):
+        """Имя из адреса не попадает в ключ кеша как есть"""
+        User.objects.create_user(username='автор с пробелом')
+        url = reverse('posts:profile',
+                      kwargs={'username': 'автор с пробелом'})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.guest_client.get(url)
+            self.assertEqual(self.guest_client.get(url)['X-Page-Cache'],
+                             'hit')
@@ -0,0 +1,61 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.queries import assert_query_budget, normalize
+from posts.models import Comment, Post, User
+
+COMMENTS_COUNT = 5
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(COMMENTS_COUNT):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'commentator_{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def test_normalize_replaces_literals(self):
+        """Запросы с разными параметрами сводятся к одной форме"""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+            normalize("SELECT * FROM t WHERE id = 22 AND name = 'c'"),
+        )
+        self.assertEqual(normalize('WHERE id IN (%s, %s, %s)'),
+                         normalize('WHERE id IN (%s)'))
+
+    def test_budget_catches_n_plus_one(self):
+        """assert_query_budget проваливается на повторяющихся запросах"""
+        with self.assertRaisesRegex(AssertionError, 'N\\+1'):
+            with assert_query_budget(budget=100):
+                [comment.author.username
+                 for comment in Comment.objects.all()]
+        with assert_query_budget(budget=1):
+            [comment.author.username
+             for comment in Comment.objects.select_related('author')]
+
+    def test_budget_catches_too_many_queries(self):
+        """assert_query_budget проваливается при превышении бюджета"""
+        with self.assertRaisesRegex(AssertionError, 'бюджете 1'):
+            with assert_query_budget(budget=1):
+                Post.objects.count()
+                Comment.objects.count()
+
+    @override_settings(DEBUG=True)
+    def test_post_detail_headers(self):
+        """Страница поста отдаёт заголовки инспектора без повторов"""
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(response['X-Query-Repeats'], '0')
+        self.assertTrue(int(response['X-Query-Count']) > 0)
+
+    def test_headers_only_in_debug(self):
+        """Вне DEBUG заголовки инспектора не добавляются"""
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('X-Query-Count'))
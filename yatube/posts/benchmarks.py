@@ -0,0 +1,316 @@
+import itertools
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import search, timeline
+from .ingest import ingest
+from .feed import AuthorMergeFeed, FeedPaginator, FollowFeed
+from .models import Follow, Group, Post, User
+from .paginator import CursorPaginator, POSTS_ON_PAGE, encode_cursor
+
+SCENARIOS = {}
+
+BATCH_SIZE = 5000
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """Медиана времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+@contextmanager
+def explicit_pub_date():
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_users(count, prefix='bench_user'):
+    User.objects.bulk_create(
+        User(username=f'{prefix}_{i}') for i in range(count)
+    )
+    return list(User.objects.filter(username__startswith=f'{prefix}_'))
+
+
+def seed_groups(count):
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'bench-group-{i}',
+              description='Группа для замеров')
+        for i in range(count)
+    )
+    return list(Group.objects.filter(slug__startswith='bench-group-'))
+
+
+def seed_posts(count, authors, groups=(), step=timedelta(seconds=1),
+               text=None):
+    """Создаёт count постов с убывающими датами публикации.
+
+    text(i) — текст i-го поста, по умолчанию «Тестовый пост i».
+    """
+    text = text or 'Тестовый пост {}'.format
+    start = timezone.now()
+    groups = list(groups) or [None]
+    with explicit_pub_date():
+        for offset in range(0, count, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(
+                    text=text(i),
+                    author=authors[i % len(authors)],
+                    group=groups[i % len(groups)],
+                    pub_date=start - step * i,
+                )
+                for i in range(offset, min(offset + BATCH_SIZE, count))
+            )
+
+
+def page_depths(total_pages):
+    depth = 1
+    while depth < total_pages:
+        yield depth
+        depth *= 10
+    yield total_pages
+
+
+@scenario('pagination')
+def pagination(stdout, size, repeat, **options):
+    """OFFSET-пагинация против курсорной на разной глубине ленты."""
+    authors = seed_users(10)
+    seed_posts(size, authors, seed_groups(5))
+    post_list = Post.objects.all()
+    total_pages = Paginator(post_list, POSTS_ON_PAGE).num_pages
+    stdout.write(f'{"page":>8} {"offset, ms":>12} {"cursor, ms":>12}')
+    for number in page_depths(total_pages):
+        boundary = (number - 1) * POSTS_ON_PAGE - 1
+        cursor = None
+        if boundary >= 0:
+            row = post_list.order_by('-pub_date', '-id')[boundary]
+            cursor = encode_cursor((row.pub_date, row.id))
+
+        def offset_page():
+            list(Paginator(post_list, POSTS_ON_PAGE).get_page(number))
+
+        def cursor_page():
+            list(CursorPaginator(post_list, POSTS_ON_PAGE).cursor_page(
+                after=cursor
+            ))
+
+        stdout.write(
+            f'{number:>8} {measure(offset_page, repeat):>12.2f} '
+            f'{measure(cursor_page, repeat):>12.2f}'
+        )
+
+
+@scenario('follow_feed')
+def follow_feed(stdout, size, repeat, follows=10000, **options):
+    """JOIN по подпискам против таблицы лент и k-way слияния по авторам."""
+    authors = seed_users(1000, prefix='bench_author')
+    seed_posts(size, authors)
+    readers = {
+        count: User.objects.create_user(username=f'bench_reader_{count}')
+        for count in (10, 100, 1000)
+    }
+    for count, reader in readers.items():
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author) for author in authors[:count]
+        )
+    rest = follows - sum(readers)
+    fillers = seed_users(max(rest // 10, 0), prefix='bench_filler')
+    Follow.objects.bulk_create(
+        Follow(user=filler, author=authors[(i * 10 + j) % len(authors)])
+        for i, filler in enumerate(fillers) for j in range(10)
+    )
+    timeline.backfill(Follow.objects.filter(user__in=readers.values()))
+    stdout.write(f'{"follows":>8} {"page":>5} {"join, ms":>10} '
+                 f'{"timeline, ms":>13} {"kway, ms":>10}')
+    for count, reader in readers.items():
+        joined = Post.objects.filter(author__following__user=reader)
+        # На маленьком --size у редкого читателя нет и 50 страниц.
+        total_pages = Paginator(joined, POSTS_ON_PAGE).num_pages
+        for depth in sorted({1, min(50, total_pages)}):
+            boundary = (depth - 1) * POSTS_ON_PAGE - 1
+            cursor = None
+            if boundary >= 0:
+                row = joined.order_by('-pub_date', '-id')[boundary]
+                cursor = encode_cursor((row.pub_date, row.id))
+
+            def join_page():
+                list(CursorPaginator(joined, POSTS_ON_PAGE).cursor_page(
+                    after=cursor
+                ))
+
+            def feed_page(feed_class):
+                return lambda: list(FeedPaginator(
+                    feed_class(reader), POSTS_ON_PAGE
+                ).cursor_page(after=cursor))
+
+            stdout.write(
+                f'{count:>8} {depth:>5} {measure(join_page, repeat):>10.2f} '
+                f'{measure(feed_page(FollowFeed), repeat):>13.2f} '
+                f'{measure(feed_page(AuthorMergeFeed), repeat):>10.2f}'
+            )
+
+
+@scenario('card_cache')
+def card_cache(stdout, size, repeat, **options):
+    """Отрисовка главной: без кеша карточек и со сборкой из тёплых карточек.
+
+    Версия страницы меняется на каждом замере, так что фрагмент страницы
+    всегда собирается заново, а карточки берутся из кеша.
+    """
+    seed_posts(size, seed_users(10), seed_groups(5))
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    versions = itertools.count()
+
+    def render(timeout):
+        return lambda: render_to_string('posts/index.html', {
+            'page_obj': CursorPaginator(
+                Post.objects.for_feed(), POSTS_ON_PAGE
+            ).get_page(1),
+            'cache_version': f'bench-{next(versions)}',
+            'feed_cache_timeout': timeout,
+        }, request)
+
+    cache.clear()
+    cold = measure(render(0), repeat)
+    render(60)()
+    warm = measure(render(60), repeat)
+    stdout.write(f'{"cards":>10} {"render, ms":>12}')
+    stdout.write(f'{"cold":>10} {cold:>12.2f}')
+    stdout.write(f'{"warm":>10} {warm:>12.2f}')
+
+
+def sample_photo(megapixels):
+    """JPEG 4:3 с плавными переходами и фигурами, как у снимка с телефона."""
+    height = int((megapixels * 10 ** 6 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for step in range(0, width, width // 16):
+        draw.ellipse((step, step % height, step + width // 10,
+                      step % height + height // 10),
+                     fill=(step % 255, 120, 255 - step % 255))
+    content = BytesIO()
+    image.save(content, 'JPEG', quality=92)
+    return content.getvalue()
+
+
+def naive_ingest(content):
+    """Приём без ingest: полная распаковка, уменьшение, пересохранение."""
+    image = Image.open(BytesIO(content))
+    image.load()
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side), Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=settings.POST_IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def decoded_megabytes(content, draft):
+    image = Image.open(BytesIO(content))
+    if draft:
+        side = settings.POST_IMAGE_MAX_SIDE
+        image.draft('RGB', (side, side))
+    width, height = image.size
+    return width * height * len(image.getbands()) / 2 ** 20
+
+
+@scenario('image_ingest')
+def image_ingest(stdout, repeat, **options):
+    """Приём фотографий разного размера: время, память и вес файла.
+
+    Буферы картинок Pillow выделяет мимо аллокатора Python, поэтому память
+    оценивается по размеру распакованного холста.
+    """
+    stdout.write(f'{"MP":>4} {"upload, KB":>11} {"stored, KB":>11} '
+                 f'{"naive, ms":>10} {"ingest, ms":>11} '
+                 f'{"naive, MB":>10} {"ingest, MB":>11}')
+    for megapixels in (2, 12, 24, 48):
+        content = sample_photo(megapixels)
+        stored = len(ingest(SimpleUploadedFile('photo.jpg', content)).read())
+        naive = measure(lambda: naive_ingest(content), repeat)
+        ingested = measure(
+            lambda: ingest(SimpleUploadedFile('photo.jpg', content)), repeat)
+        stdout.write(
+            f'{megapixels:>4} {len(content) / 1024:>11.0f} '
+            f'{stored / 1024:>11.0f} {naive:>10.1f} {ingested:>11.1f} '
+            f'{decoded_megabytes(content, False):>10.1f} '
+            f'{decoded_megabytes(content, True):>11.1f}'
+        )
+
+
+def vocabulary(size, seed=0):
+    """Слова из слогов с частотами по закону Ципфа, как в живых текстах."""
+    rng = random.Random(seed)
+    syllables = ['ка', 'ло', 'ми', 'ре', 'ту', 'на', 'по', 'ст', 'вер', 'мон',
+                 'зи', 'да', 'ку', 'ле', 'ор', 'пти', 'сан', 'фе']
+    words = sorted({
+        ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        for _ in range(size * 2)
+    })[:size]
+    rng.shuffle(words)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+@scenario('search')
+def search_scenario(stdout, size, repeat, **options):
+    """Поиск слова: LIKE по всей таблице против индекса FTS5.
+
+    Замеряется то, что делает страница поиска: число найденных и первая
+    страница. Частое, среднее и редкое слово дают разный размер выдачи.
+    """
+    if not search.available():
+        stdout.write('Полнотекстовый индекс есть только в SQLite.')
+        return
+    words, weights = vocabulary(2000)
+    rng = random.Random(1)
+    seed_posts(size, seed_users(10), text=lambda i: ' '.join(
+        rng.choices(words, weights, k=12)))
+    search.rebuild()
+    stdout.write(f'{"word":>12} {"found":>8} {"icontains, ms":>14} '
+                 f'{"fts5, ms":>10}')
+    for word in (words[0], words[50], words[1500]):
+        like = Post.objects.for_feed().filter(text__icontains=word)
+        found = search.SearchResults(word)
+
+        def by_like():
+            like.count()
+            list(like[:POSTS_ON_PAGE])
+
+        def by_index():
+            found.count()
+            found[:POSTS_ON_PAGE]
+
+        stdout.write(f'{word:>12} {found.count():>8} '
+                     f'{measure(by_like, repeat):>14.1f} '
+                     f'{measure(by_index, repeat):>10.1f}')
@@ -0,0 +1,20 @@
+"""Условные GET-запросы для лент и страницы поста.
+
+ETag строится из поколений кеша без запросов к базе и меняется при любой
+записи в областях страницы, в том числе при удалении старых постов
+и изменении счётчиков. Last-Modified не отдаётся: MAX(updated) этих
+изменений не замечает, и клиент получал бы 304 на устаревшую страницу.
+"""
+from django.views.decorators.http import condition
+
+from core.cache import page_etag, page_scopes
+
+
+def etag(*scopes):
+    def build(request, **kwargs):
+        return page_etag(request, page_scopes(scopes, kwargs))
+    return build
+
+
+def conditional_page(*scopes):
+    return condition(etag_func=etag(*scopes))
@@ -0,0 +1,71 @@
+from django.db.models import (Count, F, IntegerField, OuterRef, Subquery,
+                              Sum)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def bump_author(user_id, **deltas):
+    """Атомарно сдвигает счётчики автора.
+
+    Строка счётчиков создаётся только при увеличении: при удалениях
+    (в том числе каскадных вместе с пользователем) её может уже не быть.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    stats = AuthorStats.objects.filter(user_id=user_id, **{
+        f'{field}__gte': -delta
+        for field, delta in deltas.items() if delta < 0
+    })
+    if stats.update(**changes) or min(deltas.values()) < 0:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    stats.update(**changes)
+
+
+def bump_comments(post_id, delta):
+    """Сдвигает счётчик комментариев и отметку изменения поста,
+    по которой кешируется его карточка."""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gte=-delta)
+    posts.update(comment_count=F('comment_count') + delta,
+                 updated=timezone.now())
+
+
+def stats_for(user):
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats.objects.get_or_create(user=user)[0]
+
+
+def followed_posts_count(user):
+    """Оценка размера ленты подписок по счётчикам постов авторов."""
+    return AuthorStats.objects.filter(
+        user__following__user=user
+    ).aggregate(total=Sum('posts_count'))['total'] or 0
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def recount():
+    """Пересчитывает все счётчики по исходным таблицам."""
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk)
+         for pk in User.objects.values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    Post.objects.update(comment_count=_count(Comment.objects.all(), 'post'))
@@ -0,0 +1,238 @@
+import heapq
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+from . import timeline
+from .models import Post, TimelineEntry
+from .paginator import (CursorPage, CursorPaginator, fetch_rows,
+                        keyset_filter)
+
+logger = logging.getLogger(__name__)
+
+PUSHED = 'pushed'
+PULLED = 'pulled'
+
+
+@dataclass
+class FeedStats:
+    pushed: int = 0
+    pulled: int = 0
+    pulled_authors: int = 0
+    scans: int = 0
+    duplicates: int = 0
+    elapsed_ms: float = 0.0
+
+
+class MergedFeed(ABC):
+    """Лента из нескольких отсортированных источников, слитых через кучу.
+
+    Строки ленты — кортежи (pub_date, post_id, источник) в порядке
+    убывания даты публикации. Каждый источник читается ограниченным
+    диапазоном по индексу, поэтому для страницы достаточно limit строк
+    из каждого.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.scans = 0
+        self.duplicates = 0
+        self.elapsed_ms = 0.0
+
+    @cached_property
+    def pulled_authors(self):
+        return []
+
+    @abstractmethod
+    def sources(self):
+        """Тройки (имя, ключи сортировки, queryset) источников ленты."""
+
+    def fetch(self, after=None, before=None, limit=None):
+        start = time.perf_counter()
+        runs = [
+            [
+                (*values, name)
+                for values in fetch_rows(queryset.values_list(*keys), keys,
+                                         after, before, limit)
+            ]
+            for name, keys, queryset in self.sources()
+        ]
+        rows, seen = [], set()
+        for row in heapq.merge(*runs, reverse=True):
+            if row[1] not in seen:
+                seen.add(row[1])
+                rows.append(row)
+        self.scans = len(runs)
+        self.duplicates = sum(map(len, runs)) - len(rows)
+        if limit is not None:
+            rows = rows[-limit:] if before is not None else rows[:limit]
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+        return rows
+
+    def count(self):
+        return sum(
+            queryset.count() for name, keys, queryset in self.sources()
+        )
+
+    def __getitem__(self, index):
+        # Каждый источник читается до конца среза, поэтому FeedPaginator
+        # не пускает по номерам глубже FEED_OFFSET_PAGES страниц.
+        return self.fetch(limit=index.stop)[index]
+
+
+class FollowFeed(MergedFeed):
+    """Разложенные по ленте посты плюс посты популярных авторов."""
+
+    @cached_property
+    def pulled_authors(self):
+        return list(timeline.pulled_authors(self.user))
+
+    def sources(self):
+        yield PUSHED, ('pub_date', 'post_id'), TimelineEntry.objects.filter(
+            user=self.user
+        )
+        if self.pulled_authors:
+            yield PULLED, ('pub_date', 'id'), Post.objects.filter(
+                author_id__in=self.pulled_authors
+            )
+
+    def count(self):
+        # Записи ленты популярных авторов повторяют их посты.
+        return TimelineEntry.objects.filter(user=self.user).exclude(
+            author_id__in=self.pulled_authors
+        ).count() + Post.objects.filter(
+            author_id__in=self.pulled_authors
+        ).count()
+
+
+class AuthorMergeFeed(MergedFeed):
+    """K-way слияние проходов по индексу (author, pub_date) без таблицы лент.
+
+    Один групповой запрос находит «голову» каждого автора — ближайшую к
+    курсору дату публикации. Авторы просматриваются в порядке голов, и
+    проход останавливается, как только следующая голова уже не может
+    попасть на страницу, поэтому запросов не больше, чем limit + 1.
+    """
+
+    keys = ('pub_date', 'id')
+
+    @cached_property
+    def pulled_authors(self):
+        return list(self.user.follower.values_list('author_id', flat=True))
+
+    def sources(self):
+        for author_id in self.pulled_authors:
+            yield PULLED, self.keys, Post.objects.filter(author_id=author_id)
+
+    def heads(self, after=None, before=None):
+        newer = before is not None
+        posts = Post.objects.filter(author_id__in=self.pulled_authors)
+        if before is not None or after is not None:
+            posts = posts.filter(keyset_filter(
+                self.keys, before if newer else after, newer
+            ))
+        aggregate = Min if newer else Max
+        heads = posts.order_by().values('author_id').annotate(
+            head=aggregate('pub_date')
+        ).values_list('head', 'author_id')
+        return sorted(heads, reverse=not newer)
+
+    def fetch(self, after=None, before=None, limit=None):
+        if limit is None or not self.pulled_authors:
+            return super().fetch(after, before, limit)
+        start = time.perf_counter()
+        newer = before is not None
+        rows, self.scans = [], 0
+        for head, author_id in self.heads(after, before):
+            if len(rows) >= limit:
+                cutoff = rows[-limit][0] if newer else rows[limit - 1][0]
+                if head > cutoff if newer else head < cutoff:
+                    break
+            scanned = fetch_rows(
+                Post.objects.filter(author_id=author_id).values_list(
+                    *self.keys
+                ),
+                self.keys, after, before, limit
+            )
+            self.scans += 1
+            rows = list(heapq.merge(
+                rows, [(*values, PULLED) for values in scanned], reverse=True
+            ))
+            rows = rows[-limit:] if newer else rows[:limit]
+        self.duplicates = 0
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+        return rows
+
+    def count(self):
+        return Post.objects.filter(author_id__in=self.pulled_authors).count()
+
+
+FEED_ENGINES = {
+    'hybrid': FollowFeed,
+    'kway': AuthorMergeFeed,
+}
+
+
+def follow_feed(user):
+    return FEED_ENGINES[settings.FOLLOW_FEED_ENGINE](user)
+
+
+class FeedCursorPage(CursorPage):
+    @property
+    def feed_stats(self):
+        # Статистику собирает загрузка строк, так что страница
+        # из кеша шаблона не читает ленту ради неё.
+        self._window
+        return self.paginator.stats
+
+
+class FeedPaginator(CursorPaginator):
+    """Листает MergedFeed и прикладывает к странице статистику сборки.
+
+    По номерам открываются только первые FEED_OFFSET_PAGES страниц:
+    дальше лента листается курсорами.
+    """
+
+    cursor_page_class = FeedCursorPage
+
+    @property
+    def last_number(self):
+        return min(self.num_pages, settings.FEED_OFFSET_PAGES)
+
+    def validate_number(self, number):
+        return min(super().validate_number(number), self.last_number)
+
+    def get_items(self, rows):
+        posts = Post.objects.for_feed().in_bulk(
+            [row[1] for row in rows]
+        )
+        self.stats = self.collect_stats(rows)
+        return [posts[row[1]] for row in rows if row[1] in posts]
+
+    def collect_stats(self, rows):
+        feed = self.object_list
+        sources = [row[2] for row in rows]
+        stats = FeedStats(
+            pushed=sources.count(PUSHED),
+            pulled=sources.count(PULLED),
+            pulled_authors=len(feed.pulled_authors),
+            scans=feed.scans,
+            duplicates=feed.duplicates,
+            elapsed_ms=feed.elapsed_ms,
+        )
+        logger.debug('Follow feed page for %s: %s', feed.user, stats)
+        return stats
+
+    def fetch(self, after=None, before=None, limit=None):
+        return self.object_list.fetch(after=after, before=before,
+                                      limit=limit)
+
+    def _get_page(self, rows, number, paginator):
+        page = super()._get_page(self.get_items(rows), number, paginator)
+        page.feed_stats = self.stats
+        return page
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 
+from posts.ingest import check_size, ingest
 from posts.models import Comment, Post
 
 User = get_user_model()
@@ -11,6 +13,24 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean(self):
+        # От слишком большого файла после приёма остаётся пустышка, и поле
+        # ругается, что это не картинка: настоящая причина — размер.
+        image = self.files.get(self.add_prefix('image'))
+        if isinstance(image, UploadedFile):
+            try:
+                check_size(image)
+            except forms.ValidationError as error:
+                self.errors.pop('image', None)
+                self.add_error('image', error)
+        return super().clean()
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,42 @@
+from django.template.loader import render_to_string
+
+from core.holes import hole
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@hole('switcher')
+def switcher(request, active):
+    return render_to_string('includes/switcher.html', {active: True},
+                            request)
+
+
+@hole('follow_button')
+def follow_button(request, author_id, username):
+    user = request.user
+    if not user.is_authenticated or user.pk == author_id:
+        return ''
+    following = Follow.objects.filter(user=user, author_id=author_id).exists()
+    return render_to_string('includes/follow_button.html', {
+        'username': username,
+        'following': following,
+    }, request)
+
+
+@hole('post_edit_link')
+def post_edit_link(request, post_id, author_id):
+    if request.user.pk != author_id:
+        return ''
+    return render_to_string('includes/post_edit_link.html',
+                            {'post_id': post_id}, request)
+
+
+@hole('comment_form')
+def comment_form(request, post_id):
+    if not request.user.is_authenticated:
+        return ''
+    return render_to_string('includes/comment_form.html', {
+        'post_id': post_id,
+        'form': CommentForm(),
+    }, request)
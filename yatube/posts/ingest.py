@@ -0,0 +1,140 @@
+"""Приём картинок постов: проверка размеров и уменьшение до сохранения.
+
+Файл тяжелее POST_IMAGE_MAX_BYTES отбрасывается ещё при разборе запроса
+(см. posts.uploads), а здесь лишь отклоняется. Число пикселей
+проверяется по заголовку, до распаковки, так что «бомба» из крошечного
+файла с огромным холстом не займёт память. Затем картинка
+поворачивается по EXIF, уменьшается до POST_IMAGE_MAX_SIDE по большей
+стороне и пересохраняется без метаданных.
+"""
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Сколько байт держать в памяти, прежде чем перейти на временный файл.
+SPOOL_SIZE = 2 * 1024 * 1024
+
+# Форматы, которые пересохраняются как есть. Прочие (TIFF, BMP и т. п.)
+# переводятся в PNG, если в них есть прозрачность, или в JPEG.
+WEB_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+PNG_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA')
+
+
+def _too_large():
+    return ValidationError(
+        'Файл больше %(limit)s.',
+        code='file_too_large',
+        params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+    )
+
+
+def check_size(upload):
+    if upload.size and upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise _too_large()
+
+
+def _spool(upload):
+    # Файлы не из запроса (например, из команд) проверяются по мере чтения.
+    check_size(upload)
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    received = 0
+    for chunk in upload.chunks():
+        received += len(chunk)
+        if received > settings.POST_IMAGE_MAX_BYTES:
+            spooled.close()
+            raise _too_large()
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+# Ошибки Pillow на повреждённых файлах: обрезанный JPEG открывается
+# по заголовку и падает только при распаковке.
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def _unreadable():
+    return ValidationError('Не удалось прочитать картинку.',
+                           code='invalid_image')
+
+
+def _open(source):
+    try:
+        image = Image.open(source)
+    except IMAGE_ERRORS:
+        raise _unreadable()
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    return image
+
+
+def _encode(image, image_format):
+    options = {}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'quality': settings.POST_IMAGE_QUALITY, 'optimize': True}
+    elif image_format == 'WEBP':
+        options = {'quality': settings.POST_IMAGE_QUALITY}
+    elif image_format == 'PNG':
+        if image.mode not in PNG_MODES:
+            image = image.convert('RGBA')
+        options = {'optimize': True}
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    content = BytesIO()
+    image.save(content, image_format, **options)
+    return content.getvalue()
+
+
+def _target_format(image):
+    if image.format in WEB_FORMATS:
+        return image.format
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        return 'PNG'
+    return 'JPEG'
+
+
+def _target_name(name, image_format):
+    if image_format not in EXTENSIONS:
+        return name
+    return os.path.splitext(name)[0] + EXTENSIONS[image_format]
+
+
+def ingest(upload):
+    """Проверенная и уменьшенная картинка вместо загруженного файла.
+
+    Имя файла сохраняется, кроме расширения переведённых в PNG или JPEG.
+    Бросает ValidationError, если файл или холст больше допустимого или
+    картинка анимирована: кадры анимации не уменьшаются и не чистятся.
+    """
+    with _spool(upload) as source:
+        image = _open(source)
+        if getattr(image, 'is_animated', False):
+            raise ValidationError('Анимированные картинки не поддерживаются.',
+                                  code='animated_image')
+        image_format = _target_format(image)
+        side = settings.POST_IMAGE_MAX_SIDE
+        try:
+            # JPEG умеет распаковываться сразу в 1/2, 1/4 или 1/8 размера.
+            image.draft('RGB', (side, side))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((side, side), Image.LANCZOS)
+            content = _encode(image, image_format)
+        except IMAGE_ERRORS:
+            raise _unreadable()
+        return ContentFile(content,
+                           name=_target_name(upload.name, image_format))
@@ -0,0 +1,122 @@
+"""Хранилище ключей sorl-thumbnail с локальным LRU-кешем в процессе.
+
+Каждая карточка с картинкой спрашивает у хранилища, нарезана ли
+миниатюра. Штатное cached_db ходит за этим в общий кеш, а при промахе
+в базу; здесь ответы ещё и держатся в памяти процесса не дольше
+THUMBNAIL_LOCAL_CACHE_TIMEOUT секунд, так что другие процессы увидят
+новую миниатюру с задержкой не больше этого срока.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.kvstores import cached_db_kvstore
+
+# Сколько ждать чужой загрузки ключа, прежде чем загрузить его самому.
+LOAD_WAIT = 5
+
+
+class LocalCache:
+    """Ограниченный LRU со сроком жизни записей и загрузкой в один поток.
+
+    Если ключа нет, его загружает первый запросивший поток, а остальные
+    ждут результата, а не идут за тем же ключом в общий кеш и базу.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def get(self, key, load):
+        with self.lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            event = self.loading.get(key)
+            if event is None:
+                event = self.loading[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            event.wait(LOAD_WAIT)
+            with self.lock:
+                found, value = self._lookup(key)
+            if found:
+                return value
+            return load()
+        try:
+            value = load()
+            self.set(key, value)
+            return value
+        finally:
+            with self.lock:
+                self.loading.pop(key, None)
+            event.set()
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.entries)}
+
+
+local = LocalCache(settings.THUMBNAIL_LOCAL_CACHE_SIZE,
+                   settings.THUMBNAIL_LOCAL_CACHE_TIMEOUT)
+
+
+def stats():
+    """Попадания и промахи локального кеша с запуска процесса."""
+    return local.stats()
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def _get_raw(self, key):
+        return local.get(key, lambda: super(KVStore, self)._get_raw(key))
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        local.set(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        local.delete(*keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        local.clear()
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache import bump
+from posts.models import Post
+from posts.placeholders import placeholder
+from posts.storage import post_images
+
+
+def missing_names(batch_size):
+    """Имена картинок постов без заглушки, пачками по алфавиту."""
+    after = ''
+    while True:
+        names = list(
+            Post.objects.exclude(image='').filter(
+                image_placeholder='', image__gt=after
+            ).order_by('image').values_list('image', flat=True).distinct()[
+                :batch_size]
+        )
+        if not names:
+            return
+        yield names
+        after = names[-1]
+
+
+def fill(name):
+    """Записывает заглушку и размеры во все посты с этой картинкой."""
+    with post_images.open(name) as file:
+        data, width, height = placeholder(file)
+    posts = Post.objects.filter(image=name, image_placeholder='')
+    rows = list(posts.values_list('author_id', 'group_id'))
+    posts.update(image_placeholder=data, image_width=width,
+                 image_height=height, updated=timezone.now())
+    bump('posts', *{f'author:{author_id}' for author_id, _ in rows},
+         *{f'group:{group_id}' for _, group_id in rows if group_id})
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = ('Считает заглушки и размеры картинок постов, загруженных '
+            'до их появления. Каждый файл читается один раз, сколько бы '
+            'постов на него ни ссылалось.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько файлов обрабатывать за проход.')
+
+    def handle(self, *args, batch_size, **options):
+        files = posts = failed = 0
+        start = time.monotonic()
+        for names in missing_names(batch_size):
+            for name in names:
+                try:
+                    posts += fill(name)
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                files += 1
+            self.stdout.write(f'Файлов: {files}, постов: {posts}, '
+                              f'ошибок: {failed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: файлов {files}, постов {posts}, ошибок {failed} '
+            f'за {time.monotonic() - start:.1f} с'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow, TimelineEntry
+from posts.timeline import backfill
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок по существующим записям Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить текущие записи лент перед '
+                                 'заполнением.')
+
+    def handle(self, *args, clear, **options):
+        if clear:
+            TimelineEntry.objects.all().delete()
+        count = backfill(Follow.objects.order_by('pk'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {count}, '
+            f'записей в лентах: {TimelineEntry.objects.count()}'
+        ))
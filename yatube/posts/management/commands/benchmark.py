@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = ('Замеры производительности на сгенерированных данных. '
+            'Данные создаются в транзакции и откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--size', type=int, default=100000,
+                            help='Количество постов в наборе данных.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов на каждый замер.')
+        parser.add_argument('--follows', type=int, default=10000,
+                            help='Количество подписок для замеров лент.')
+
+    def handle(self, *args, scenario, **options):
+        with transaction.atomic():
+            SCENARIOS[scenario](self.stdout, **options)
+            transaction.set_rollback(True)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+from posts.timeline import mismatched_authors, switch_mode
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'по исходным таблицам и переводит авторов, чьё число '
+            'подписчиков разошлось с режимом лент.')
+
+    def handle(self, *args, **options):
+        recount()
+        switched = 0
+        for author_id in mismatched_authors():
+            switch_mode(author_id)
+            switched += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, авторов переведено: {switched}'))
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache import bump
+from posts.models import Post
+from posts.thumbnails import regenerate
+
+DEFAULT_CHECKPOINT = os.path.join(tempfile.gettempdir(),
+                                  'yatube_thumbnails_checkpoint')
+
+
+def images(after, chunk_size, pks=None):
+    """Посты с картинками пачками по возрастанию pk, без OFFSET."""
+    posts = Post.objects.exclude(image='')
+    if pks:
+        posts = posts.filter(pk__in=pks)
+    while True:
+        chunk = list(
+            posts.filter(pk__gt=after).order_by(
+                'pk'
+            ).values_list(
+                'pk', 'image', 'author_id', 'group_id'
+            )[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1][0]
+
+
+def regenerate_safely(name, force):
+    try:
+        regenerate(name, force)
+    except Exception as error:
+        return f'{type(error).__name__}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры всех картинок постов в пуле процессов. '
+            'После каждой пачки сохраняет контрольную точку, с которой '
+            'можно продолжить прерванный запуск.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Процессов в пуле; 1 — без пула.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Не больше стольких картинок в секунду.')
+        parser.add_argument('--force', action='store_true',
+                            help='Удалить и нарезать заново уже готовые '
+                                 'миниатюры.')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                            help='Файл с pk последнего обработанного поста.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с начала, не глядя на контрольную '
+                                 'точку.')
+        parser.add_argument('--posts', type=int, nargs='+', metavar='PK',
+                            help='Только эти посты, например упавшие '
+                                 'в прошлый раз; контрольная точка '
+                                 'не читается и не пишется.')
+
+    def handle(self, *args, workers, chunk_size, rate, force, checkpoint,
+               restart, posts, **options):
+        # Выборочный запуск не трогает контрольную точку: иначе следующий
+        # полный запуск продолжил бы с pk выбранного поста.
+        if posts:
+            checkpoint = None
+        after = 0 if restart or not checkpoint else self.read_checkpoint(
+            checkpoint)
+        if after:
+            self.stdout.write(f'Продолжаем после поста {after}')
+        pool = None
+        if workers > 1:
+            # spawn: дочерним процессам не достаются открытые соединения.
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        done = 0
+        failed = []
+        start = time.monotonic()
+        try:
+            for chunk in images(after, chunk_size, posts):
+                # Один файл бывает у многих постов: режется он один раз,
+                # иначе процессы пула с --force удаляли бы миниатюры,
+                # которые в это время режет соседний.
+                names = list(dict.fromkeys(row[1] for row in chunk))
+                errors = self.cut(pool, force, names,
+                                  self.throttle(names, rate, start, done))
+                ready = []
+                for row in chunk:
+                    error = errors[row[1]]
+                    if error:
+                        failed.append(row[0])
+                        self.stderr.write(f'Пост {row[0]}, {row[1]}: {error}')
+                    else:
+                        ready.append(row)
+                self.refresh_cards(ready)
+                done += len(names)
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, chunk[-1][0])
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'Обработано {done}, ошибок {len(failed)}, '
+                    f'{done / elapsed:.1f} картинок/с'
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} картинок за {elapsed:.1f} с '
+            f'({done / elapsed if elapsed else 0:.1f} картинок/с), '
+            f'ошибок: {len(failed)}'
+        ))
+        if failed:
+            pks = ' '.join(map(str, failed))
+            self.stderr.write(f'Не удалось: {pks}\n'
+                              f'Повторить: --posts {pks}')
+
+    def cut(self, pool, force, names, throttled):
+        """Ошибки нарезки по именам файлов (None — файл нарезан).
+
+        throttled — те же имена, отдаваемые не быстрее заданной скорости.
+        """
+        if pool is None:
+            return {name: regenerate_safely(name, force)
+                    for name in throttled}
+        errors = pool.map(regenerate_safely, throttled, [force] * len(names))
+        return dict(zip(names, errors))
+
+    def refresh_cards(self, rows):
+        """Сбрасывает кеш карточек, показывавших исходную картинку."""
+        if not rows:
+            return
+        Post.objects.filter(pk__in=[row[0] for row in rows]).update(
+            updated=timezone.now())
+        bump('posts', *{f'author:{row[2]}' for row in rows},
+             *{f'group:{row[3]}' for row in rows if row[3]})
+
+    def throttle(self, names, rate, start, done):
+        """Отдаёт имена не быстрее rate в секунду от начала запуска."""
+        for index, name in enumerate(names):
+            if rate:
+                delay = start + (done + index) / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield name
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, pk):
+        with open(path, 'w') as checkpoint:
+            checkpoint.write(str(pk))
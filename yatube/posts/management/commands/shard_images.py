@@ -0,0 +1,90 @@
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import bump
+from posts import media
+from posts.models import MediaFile, Post
+from posts.storage import SHARDED_NAME, post_images
+
+
+def flat_names(batch_size):
+    """Имена картинок вне каталогов по хешу, пачками по алфавиту."""
+    after = ''
+    while True:
+        names = list(
+            Post.objects.exclude(image='').exclude(
+                image__regex=SHARDED_NAME.pattern
+            ).filter(image__gt=after).order_by('image').values_list(
+                'image', flat=True
+            ).distinct()[:batch_size]
+        )
+        if not names:
+            return
+        yield names
+        after = names[-1]
+
+
+@transaction.atomic
+def switch(name, target):
+    """Переводит посты на новое имя файла и переносит счётчик ссылок.
+
+    Старый файл удаляется после фиксации, если на него больше никто
+    не ссылается: до этого момента его ещё могут показывать
+    закешированные страницы.
+    """
+    posts = Post.objects.filter(image=name)
+    rows = list(posts.values_list('author_id', 'group_id'))
+    posts.update(image=target, updated=timezone.now())
+    refs = MediaFile.objects.filter(name=name).values_list(
+        'refs', flat=True).first()
+    MediaFile.objects.filter(name=name).update(refs=0)
+    media.retain(target, refs or len(rows))
+    transaction.on_commit(lambda: media.purge(name))
+    bump('posts', *{f'author:{author_id}' for author_id, _ in rows},
+         *{f'group:{group_id}' for _, group_id in rows if group_id})
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов из плоского каталога в каталоги '
+            'по хешу содержимого и переписывает пути в постах. Файл сначала '
+            'копируется, потом на него переключаются посты, и только затем '
+            'удаляется старый: сайт работает всё время переноса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько файлов переносить за проход.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Пауза между пачками в секундах.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать файлы для переноса.')
+
+    def handle(self, *args, batch_size, sleep, dry_run, **options):
+        files = posts = failed = 0
+        start = time.monotonic()
+        for names in flat_names(batch_size):
+            for name in names:
+                if dry_run:
+                    files += 1
+                    continue
+                try:
+                    target = post_images.shard(name)
+                except (OSError, SuspiciousFileOperation) as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                posts += switch(name, target)
+                files += 1
+            self.stdout.write(f'Перенесено файлов: {files}, постов: {posts}, '
+                              f'ошибок: {failed}')
+            if sleep:
+                time.sleep(sleep)
+        verb = 'Нужно перенести' if dry_run else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {files}, постов: {posts}, ошибок: {failed} '
+            f'за {time.monotonic() - start:.1f} с'
+        ))
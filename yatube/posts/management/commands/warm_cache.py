@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import AuthorStats, Group
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+def warm_urls(pages, profiles):
+    """Адреса для прогрева: сначала первые страницы всех лент, потом
+    следующие, чтобы при нехватке времени прогрелось самое посещаемое."""
+    feeds = [reverse('posts:index')]
+    feeds += [reverse('posts:group_posts', kwargs={'slug': slug})
+              for slug in Group.objects.values_list('slug', flat=True)]
+    feeds += [
+        reverse('posts:profile', kwargs={'username': username})
+        for username in AuthorStats.objects.order_by(
+            '-followers_count'
+        ).values_list('user__username', flat=True)[:profiles]
+    ]
+    for number in range(1, pages + 1):
+        for url in feeds:
+            yield url if number == 1 else f'{url}?page={number}'
+
+
+def warm(url):
+    """Запрашивает страницу анонимно: ответ оседает во всех кешах."""
+    start = time.perf_counter()
+    response = Client().get(url)
+    return url, response.status_code, (time.perf_counter() - start) * 1000
+
+
+def warm_in_worker(url):
+    try:
+        return warm(url)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Прогревает кеш страниц: главную, ленты групп и профили '
+            'самых популярных авторов. Имеет смысл только с общим для '
+            'всех процессов бэкендом кеша.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=3,
+                            help='Сколько первых страниц каждой ленты '
+                                 'прогреть.')
+        parser.add_argument('--profiles', type=int, default=50,
+                            help='Сколько профилей с наибольшим числом '
+                                 'подписчиков прогреть.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Размер пула; 1 — прогрев без пула.')
+        parser.add_argument('--executor', choices=sorted(EXECUTORS),
+                            default='thread')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Ограничение по времени в секундах: '
+                                 'оставшиеся адреса пропускаются.')
+
+    def handle(self, *args, pages, profiles, workers, executor, budget,
+               **options):
+        urls = list(warm_urls(pages, profiles))
+        deadline = None if budget is None else time.monotonic() + budget
+        results = []
+        if workers == 1:
+            for url in urls:
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                results.append(self.report(*warm(url)))
+        else:
+            connections.close_all()
+            with EXECUTORS[executor](max_workers=workers) as pool:
+                futures = [pool.submit(warm_in_worker, url) for url in urls]
+                for future in as_completed(futures):
+                    if deadline is not None and time.monotonic() > deadline:
+                        for pending in futures:
+                            pending.cancel()
+                        break
+                    results.append(self.report(*future.result()))
+        skipped = len(urls) - len(results)
+        total = sum(timing for timing in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {len(results)}, пропущено: {skipped}, '
+            f'суммарно {total:.0f} мс'
+        ))
+
+    def report(self, url, status, timing):
+        self.stdout.write(f'{status} {timing:>9.1f} мс  {url}')
+        return timing
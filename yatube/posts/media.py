@@ -0,0 +1,49 @@
+"""Подсчёт ссылок на файлы картинок постов.
+
+Одинаковые картинки хранятся одним файлом (см. posts.storage), поэтому
+удалять файл вместе с постом нельзя: он удаляется вместе с миниатюрами,
+только когда на него не ссылается ни один пост.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaFile
+from .storage import is_pinned, locked, post_images, unpin
+
+logger = logging.getLogger(__name__)
+
+
+def retain(name, count=1):
+    files = MediaFile.objects.filter(name=name)
+    if not files.update(refs=F('refs') + count):
+        MediaFile.objects.get_or_create(name=name)
+        files.update(refs=F('refs') + count)
+    unpin(name)
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок удаляется после фиксации."""
+    MediaFile.objects.filter(name=name, refs__gte=1).update(
+        refs=F('refs') - 1)
+    transaction.on_commit(lambda: purge(name))
+
+
+def purge(name):
+    # Строку удаляем только при нуле ссылок: если файл успели загрузить
+    # снова, счётчик уже вырос, и удаление ничего не затронет. Имя,
+    # которое только что сохранили для нового поста, не трогаем вовсе.
+    with locked(name):
+        if is_pinned(name):
+            return
+        deleted, _ = MediaFile.objects.filter(name=name, refs=0).delete()
+        if not deleted:
+            return
+        try:
+            default.kvstore.delete(ImageFile(name, post_images))
+            post_images.delete(name)
+        except Exception:
+            logger.exception('Failed to delete unreferenced image %s', name)
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_authorstats_pulled'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_group_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_author_updated_idx',
+        ),
+    ]
@@ -1,4 +1,14 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.cache import cache_version, get_or_compute, peek
 
 POSTS_ON_PAGE = 10
 
@@ -7,3 +17,235 @@ def paginate(post_list, page_number, posts_on_page=POSTS_ON_PAGE):
     paginator = Paginator(post_list, posts_on_page)
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def encode_cursor(values):
+    pub_date, pk = values
+    raw = f'{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, id) из курсора или None, если он испорчен."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        pub_date, pk = raw.split('|')
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_filter(keys, values, newer):
+    # Условие pub_date <= X избыточно, но позволяет SQLite взять
+    # диапазон по индексу вместо полного просмотра.
+    (first_key, second_key), (first, second) = keys, values
+    lookup = 'gt' if newer else 'lt'
+    return Q(**{f'{first_key}__{lookup}e': first}) & (
+        Q(**{f'{first_key}__{lookup}': first})
+        | Q(**{f'{second_key}__{lookup}': second})
+    )
+
+
+def fetch_rows(queryset, keys, after=None, before=None, limit=None):
+    """Строки строго после/до ключа в порядке убывания ключа."""
+    first_key, second_key = keys
+    if before is not None:
+        queryset = queryset.filter(keyset_filter(keys, before, newer=True))
+        rows = queryset.order_by(first_key, second_key)[:limit]
+        return list(reversed(rows))
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(keys, after, newer=False))
+    return list(queryset.order_by(f'-{first_key}', f'-{second_key}')[:limit])
+
+
+def next_cursor(page):
+    """Курсор для ссылки «вперёд»: ключ последнего поста страницы."""
+    posts = list(page)
+    return encode_cursor((posts[-1].pub_date, posts[-1].pk)) if posts else ''
+
+
+def previous_cursor(page):
+    posts = list(page)
+    return encode_cursor((posts[0].pub_date, posts[0].pk)) if posts else ''
+
+
+PAGES_ON_EACH_SIDE = 2
+PAGES_ON_ENDS = 1
+
+
+def page_window(page, on_each_side=PAGES_ON_EACH_SIDE, on_ends=PAGES_ON_ENDS):
+    """Номера страниц вокруг текущей, первые и последние; None — пропуск.
+
+    Длина окна не зависит от числа страниц: не больше
+    2 * (on_each_side + on_ends) + 3 элементов.
+    """
+    paginator = page.paginator
+    number = page.number
+    last = getattr(paginator, 'last_number', paginator.num_pages)
+    pages = sorted(
+        set(range(1, min(on_ends, last) + 1))
+        | set(range(max(number - on_each_side, 1),
+                    min(number + on_each_side, last) + 1))
+        | set(range(max(last - on_ends + 1, 1), last + 1))
+    )
+    window = []
+    for index, i in enumerate(pages):
+        if index and i - pages[index - 1] > 1:
+            window.append(
+                pages[index - 1] + 1 if i - pages[index - 1] == 2 else None
+            )
+        window.append(i)
+    return window
+
+
+class CursorPage(Page):
+    """Страница ленты, выбранная по ключу (pub_date, id) без OFFSET.
+
+    Строки читаются при первом обращении к странице, поэтому страница,
+    отрисованная из кеша шаблона, не делает запросов.
+    """
+
+    def __init__(self, paginator, load):
+        self.number = None
+        self.paginator = paginator
+        self._load = load
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    @cached_property
+    def _window(self):
+        return self._load()
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def has_next(self):
+        return self._window[1]
+
+    def has_previous(self):
+        return self._window[2]
+
+    def next_page_number(self):
+        return None
+
+    def previous_page_number(self):
+        return None
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор с keyset-навигацией по (pub_date, id).
+
+    Номера страниц (?page=N) работают как у обычного Paginator, а ссылки
+    «вперёд/назад» строятся по курсорам и не зависят от глубины страницы.
+    """
+
+    cursor_pagination = True
+    keys = ('pub_date', 'id')
+    cursor_page_class = CursorPage
+
+    def __init__(self, object_list, per_page, count_scopes=None,
+                 count_estimate=None, **kwargs):
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by(
+                *(f'-{key}' for key in self.keys)
+            )
+        self.count_scopes = count_scopes
+        self.count_estimate = count_estimate
+        self.count_is_approximate = False
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        """Число постов.
+
+        С count_scopes точное число кешируется по поколениям областей.
+        Если после записи в области его нет, а последнее известное
+        (не старше COUNT_MAX_STALENESS) или денормализованное из
+        count_estimate не меньше APPROXIMATE_COUNT_THRESHOLD, вместо
+        COUNT отдаётся приблизительное. Небольшие числа всегда точные.
+        """
+        if not self.count_scopes:
+            return self.count_rows()
+        scope = ':'.join(self.count_scopes)
+        key = f'count:{scope}:{cache_version(*self.count_scopes)}'
+        latest_key = f'count:{scope}:latest'
+        count = peek(key)
+        if count is not None:
+            return count
+        estimate = (cache.get(latest_key) if self.count_estimate is None
+                    else self.count_estimate())
+        if estimate is not None and (
+                estimate >= settings.APPROXIMATE_COUNT_THRESHOLD):
+            self.count_is_approximate = True
+            return estimate
+        count = get_or_compute(key, self.count_rows,
+                               settings.FEED_CACHE_TIMEOUT,
+                               stale_key=f'count:{scope}:stale')
+        cache.set(latest_key, count, settings.COUNT_MAX_STALENESS)
+        return count
+
+    @property
+    def last_number(self):
+        """Последний номер страницы, который можно открыть через ?page=N."""
+        return self.num_pages
+
+    @property
+    def count_label(self):
+        count = self.count
+        if not self.count_is_approximate:
+            return str(count)
+        rounded = round(count, 2 - len(str(count)))
+        return f'около {rounded:,}'.replace(',', '\u00a0')
+
+    def count_rows(self):
+        # Аннотации карточек не влияют на число строк, а с ними COUNT
+        # считается по подзапросу с группировкой.
+        if hasattr(self.object_list, 'values'):
+            return self.object_list.values('pk').order_by().count()
+        return Paginator.count.func(self)
+
+    def get_items(self, rows):
+        return rows
+
+    def fetch(self, after=None, before=None, limit=None):
+        return fetch_rows(self.object_list, self.keys, after=after,
+                          before=before, limit=limit)
+
+    def load_window(self, after=None, before=None):
+        rows = self.fetch(after=after, before=before, limit=self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        if before is not None:
+            rows = rows[-self.per_page:] if has_more else rows
+            return self.get_items(rows), True, has_more
+        return self.get_items(rows[:self.per_page]), has_more, True
+
+    def cursor_page(self, after=None, before=None):
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        if after is None and before is None:
+            return self.get_page(1)
+        return self.cursor_page_class(
+            self, lambda: self.load_window(after=after, before=before)
+        )
+
+
+def paginate_by_cursor(post_list, request, posts_on_page=POSTS_ON_PAGE,
+                       paginator_class=CursorPaginator, count_scopes=None,
+                       count_estimate=None):
+    paginator = paginator_class(post_list, posts_on_page,
+                                count_scopes=count_scopes,
+                                count_estimate=count_estimate)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return paginator.cursor_page(after=after, before=before)
+    return paginator.get_page(request.GET.get('page'))
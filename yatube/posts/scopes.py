@@ -0,0 +1,63 @@
+"""Области кеша страниц постов по аргументам адреса.
+
+Страница группы, профиля или поста сбрасывается поколением своей группы
+или автора, а не общим 'posts'. Адрес содержит slug, имя или номер поста,
+а поколения ведутся по id, поэтому соответствие кешируется: попадание
+в кеш страниц по-прежнему обходится без базы. Slug и имя пользователя
+попадают в ключ кеша хешем: в них бывают символы, недопустимые
+для memcached.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from .models import Group, Post, User
+
+# Соответствие сбрасывается при сохранении группы или пользователя,
+# а срок страхует от пропущенных сбросов.
+TIMEOUT = 60 * 60 * 24
+
+
+def _key(kind, value):
+    return f'scope:{kind}:{hashlib.md5(str(value).encode()).hexdigest()}'
+
+
+def _object_id(key, queryset, field='pk'):
+    pk = cache.get(key)
+    if pk is None:
+        pk = queryset.values_list(field, flat=True).first()
+        if pk is not None:
+            cache.set(key, pk, TIMEOUT)
+    return pk
+
+
+def forget_group(slug):
+    cache.delete(_key('group', slug))
+
+
+def forget_author(username):
+    cache.delete(_key('author', username))
+
+
+def group(slug):
+    pk = _object_id(_key('group', slug), Group.objects.filter(slug=slug))
+    return f'group:{pk}'
+
+
+def author(username):
+    pk = _object_id(_key('author', username),
+                    User.objects.filter(username=username))
+    return f'author:{pk}'
+
+
+def profile(username):
+    pk = _object_id(_key('author', username),
+                    User.objects.filter(username=username))
+    return f'profile:{pk}'
+
+
+def post_author(post_id):
+    # Автор поста не меняется; в карточке поста видно число его постов.
+    pk = _object_id(_key('post', post_id), Post.objects.filter(pk=post_id),
+                    field='author_id')
+    return f'author:{pk}'
@@ -0,0 +1,148 @@
+"""Полнотекстовый поиск по постам на индексе SQLite FTS5.
+
+Индекс posts_post_fts хранит только словарь: тексты он берёт из самой
+таблицы постов (external content), а в актуальном виде его держат
+триггеры на вставку, удаление и изменение текста. Триггеры ловят и
+bulk_create, и update(), мимо которых проходят сигналы. На других базах
+поиск откатывается к icontains.
+
+Если миграция перестроит таблицу постов, SQLite молча удалит её
+триггеры, поэтому после каждой migrate недостающие триггеры создаются
+заново, а посты переиндексируются (см. reinstall). То же вручную делает
+команда rebuild_search_index.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+TABLE = 'posts_post_fts'
+
+INSTALL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+TRIGGERS = (f'{TABLE}_insert', f'{TABLE}_delete', f'{TABLE}_update')
+
+# Миграция, которая создаёт индекс: до неё (в том числе после отката)
+# восстанавливать нечего.
+MIGRATION = ('posts', '0009_post_search_index')
+
+MATCHING_IDS = f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+
+WORD = re.compile(r'\w+')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Запрос пользователя в выражение MATCH.
+
+    Слова берутся в кавычки, чтобы операторы FTS5 в запросе не ломали
+    его, и ищутся все сразу; последнее — по префиксу, пока его допечатывают.
+    """
+    words = [f'"{word}"' for word in WORD.findall(query)]
+    if words:
+        words[-1] += '*'
+    return ' '.join(words)
+
+
+def installed(using=DEFAULT_DB_ALIAS):
+    """Есть ли индекс и все его триггеры."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [TABLE, *TRIGGERS])
+        return len(cursor.fetchall()) == len(TRIGGERS) + 1
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Создаёт индекс и триггеры, если их нет, и переиндексирует посты."""
+    with connections[using].cursor() as cursor:
+        for statement in INSTALL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности (bm25).
+
+    Отдаёт count() и срезы, как ждёт Paginator: срез — это запрос за
+    номерами постов страницы в индексе и запрос за самими постами.
+    """
+
+    def __init__(self, query):
+        self.match = match_query(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.match])
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, index):
+        if not self.match:
+            return []
+        offset, stop = index.start or 0, index.stop
+        with connection.cursor() as cursor:
+            cursor.execute(f'{MATCHING_IDS} ORDER BY rank LIMIT %s OFFSET %s',
+                           [self.match, stop - offset, offset])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def reinstall(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Приёмник post_migrate: возвращает триггеры, удалённые миграцией.
+
+    Посты, изменённые без триггеров, в индекс не попали, поэтому он
+    пересобирается целиком.
+    """
+    if connections[using].vendor != 'sqlite':
+        return
+    applied = MigrationRecorder(connections[using]).applied_migrations()
+    if MIGRATION in applied and not installed(using):
+        rebuild(using)
+
+
+def search_posts(query):
+    if available():
+        return SearchResults(query)
+    return Post.objects.for_feed().filter(text__icontains=query)
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset посты, подходящие под запрос."""
+    if not available():
+        return queryset.filter(text__icontains=query)
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(MATCHING_IDS, [match]))
@@ -0,0 +1,230 @@
+import logging
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache import bump
+
+from . import counters, media, placeholders, scopes, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+# Счётчики обновляются раньше лент: раскладка постов по лентам
+# смотрит на число подписчиков автора.
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, raw=False, **kwargs):
+    # Прежние группа и картинка нужны поколениям кеша и счётчику ссылок.
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, '')
+        )
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    # Имя автора выводится в карточках его постов и в адресе профиля,
+    # а в комментариях — и на чужих страницах. Вход сохраняет только
+    # last_login, и тогда лишний запрос не нужен.
+    instance._previous_name = None
+    if (not instance.pk or raw or update_fields is not None
+            and not set(NAME_FIELDS) & set(update_fields)):
+        return
+    instance._previous_name = User.objects.filter(
+        pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(pre_save, sender=Post)
+def compute_image_placeholder(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if not instance.image:
+        instance.image_placeholder = ''
+        instance.image_width = instance.image_height = None
+    elif not instance.image._committed:
+        # Заглушка считается один раз, при загрузке новой картинки.
+        try:
+            (instance.image_placeholder, instance.image_width,
+             instance.image_height) = placeholders.placeholder(
+                instance.image)
+        except OSError:
+            logger.exception('Placeholder failed for %s', instance.image)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_image', '')
+    if instance.image.name == previous:
+        return
+    if instance.image:
+        media.retain(instance.image.name)
+    if previous:
+        media.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, followers_count=1)
+        counters.bump_author(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, followers_count=-1)
+    counters.bump_author(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def switch_feed_mode(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.enqueue_switch(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def switch_feed_mode_back(sender, instance, **kwargs):
+    timeline.enqueue_switch(instance.author_id)
+
+
+# Поколения кеша фрагментов: изменение поста видно в общей ленте,
+# в ленте его группы и в профиле автора.
+
+
+def bump_post_scopes(author_id, *group_ids):
+    bump('posts', f'author:{author_id}',
+         *(f'group:{group_id}' for group_id in set(group_ids) if group_id))
+
+
+@receiver(post_save, sender=Post)
+def bump_saved_post(sender, instance, raw=False, **kwargs):
+    bump_post_scopes(instance.author_id, instance.group_id,
+                     getattr(instance, '_previous_group_id', None))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post(sender, instance, **kwargs):
+    bump_post_scopes(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_commented_post(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post:
+        bump_post_scopes(post['author_id'], post['group_id'])
+
+
+@receiver(post_save, sender=User)
+def bump_renamed_author(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_name', None)
+    if previous is None or previous == tuple(
+            getattr(instance, field) for field in NAME_FIELDS):
+        return
+    # Ключ карточки содержит поколение user:<id>, а страницы лент
+    # со старыми карточками сбрасываются своими областями.
+    group_ids = Post.objects.filter(author=instance).values_list(
+        'group_id', flat=True).distinct()
+    bump_post_scopes(instance.pk, *group_ids)
+    bump(f'user:{instance.pk}', f'profile:{instance.pk}')
+    username = previous[NAME_FIELDS.index('username')]
+    if username != instance.username:
+        # Старый адрес профиля больше не ведёт к автору.
+        scopes.forget_author(username)
+        post_authors = Comment.objects.filter(author=instance).values_list(
+            'post__author_id', flat=True).distinct()
+        bump(*(f'author:{author_id}' for author_id in post_authors))
+
+
+@receiver(post_save, sender=Group)
+def forget_group_scope(sender, instance, **kwargs):
+    scopes.forget_group(instance.slug)
+
+
+@receiver(post_save, sender=User)
+def forget_author_scope(sender, instance, **kwargs):
+    scopes.forget_author(instance.username)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group(sender, instance, **kwargs):
+    # В карточках постов есть ссылка на группу: её смена касается
+    # и профилей авторов этой группы, и закешированных карточек.
+    authors = instance.posts.values_list('author_id', flat=True).distinct()
+    instance.posts.update(updated=timezone.now())
+    bump('posts', f'group:{instance.pk}',
+         *(f'author:{author_id}' for author_id in authors))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow(sender, instance, **kwargs):
+    # Счётчики подписчиков и подписок видны в профилях обоих.
+    bump(f'follow:{instance.user_id}', f'profile:{instance.user_id}',
+         f'profile:{instance.author_id}')
@@ -0,0 +1,119 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл называется SHA-256 своего содержимого, поэтому одинаковые загрузки
+ложатся в один файл, а sorl-thumbnail режет его миниатюры один раз.
+Сколько постов ссылаются на файл, считает MediaFile, и файл удаляется,
+когда ссылок не остаётся (см. posts.media).
+
+Файлы раскладываются по вложенным каталогам из первых знаков хеша
+(posts/ab/cd/abcd….jpg): в одном каталоге не копятся сотни тысяч файлов.
+Старые плоские имена переносит команда shard_images.
+
+Сохранение и удаление одного имени не пересекаются: оба идут под
+блокировкой имени в общем кеше, а только что сохранённое имя помечено,
+пока пост не возьмёт на него ссылку. Иначе загрузка копии файла, который
+в этот момент удаляется как ненужный, осталась бы без файла.
+"""
+import hashlib
+import posixpath
+import re
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from core.cache import LOCK_TIMEOUT, LOCK_WAIT, WAIT_STEP
+
+# Уровни вложенности каталогов и число знаков хеша на уровень.
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+# Сколько секунд сохранённое имя ждёт ссылки от поста.
+PIN_TIMEOUT = 60
+
+SHARDED_NAME = re.compile(
+    r'(^|/)' + r'[0-9a-f]{%d}/' % SHARD_WIDTH * SHARD_DEPTH
+    + r'[0-9a-f]{64}\.\w+$'
+)
+
+
+def sharded_name(directory, digest, extension):
+    shards = [digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+              for level in range(SHARD_DEPTH)]
+    return posixpath.join(directory, *shards, digest + extension.lower())
+
+
+def is_sharded(name):
+    return bool(SHARDED_NAME.search(name))
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@contextmanager
+def locked(name):
+    """Блокировка имени файла; не дождавшись её, работаем без неё."""
+    key = f'media:{name}:lock'
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(WAIT_STEP)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def pin(name):
+    cache.set(f'media:{name}:pinned', 1, PIN_TIMEOUT)
+
+
+def unpin(name):
+    cache.delete(f'media:{name}:pinned')
+
+
+def is_pinned(name):
+    return cache.get(f'media:{name}:pinned') is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        return sharded_name(directory, file_digest(content),
+                            posixpath.splitext(filename)[1])
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        with locked(name):
+            if not self.exists(name):
+                name = super().save(name, content, max_length)
+            pin(name)
+        return name
+
+    def shard(self, name):
+        """Копирует файл со старым именем на место по хешу.
+
+        Возвращает новое имя; исходный файл остаётся на месте.
+        """
+        with self.open(name) as content:
+            target = self.content_name(name, content)
+            if not self.exists(target):
+                super().save(target, content)
+        return target
+
+
+post_images = ContentAddressedStorage()
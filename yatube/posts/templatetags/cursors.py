@@ -0,0 +1,20 @@
+from django import template
+
+from posts import paginator
+
+register = template.Library()
+
+
+@register.filter
+def next_cursor(page):
+    return paginator.next_cursor(page)
+
+
+@register.filter
+def previous_cursor(page):
+    return paginator.previous_cursor(page)
+
+
+@register.filter
+def page_window(page):
+    return paginator.page_window(page)
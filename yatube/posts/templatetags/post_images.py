@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_variants(post, full=False):
+    """Варианты картинки поста для <picture> или None, пока их режет пул."""
+    return thumbnails.ready_variants(post, full)
@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='etag-slug',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, text='Пост',
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_not_modified(self):
+        """Повторный запрос с валидаторами получает 304 без отрисовки"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_validators_change_after_writes(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        first = self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_new_csrf_token_changes_etag(self):
+        """После смены токена CSRF страница с формой отдаётся заново"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.cookies['csrftoken'] = 'a' * 64
+        first = self.client.get(url)
+        self.client.cookies['csrftoken'] = 'b' * 64
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_deleting_older_post_changes_etag(self):
+        """Удаление не самого нового поста тоже меняет ETag ленты группы"""
+        older = Post.objects.create(author=self.author, text='Старый',
+                                    group=self.group)
+        Post.objects.create(author=self.author, text='Новый',
+                            group=self.group)
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        first = self.client.get(url)
+        older.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_page_cache_answers_not_modified(self):
+        """Закешированная анонимная страница тоже отвечает 304"""
+        guest = Client()
+        url = reverse('posts:index')
+        etag = guest.get(url)['ETag']
+        response = guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
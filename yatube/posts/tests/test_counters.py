@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_count(self):
+        """Создание и удаление поста меняют счётчик постов автора"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_comment_count(self):
+        """Комментарии считаются на посте, в том числе через add_comment"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'},
+        )
+        Comment.objects.create(post=post, author=self.author, text='Ещё')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        Comment.objects.filter(author=self.author).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_follow_counts(self):
+        """Подписка и отписка меняют счётчики подписчиков и подписок"""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_cascade_delete_of_user(self):
+        """Удаление пользователя каскадом обновляет счётчики других"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        User.objects.get(pk=self.reader.pk).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_recount_command(self):
+        """Команда recount_counters исправляет разъехавшиеся счётчики"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.update(posts_count=7, followers_count=7)
+        Post.objects.update(comment_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_pages_show_counters(self):
+        """Профиль и страница поста показывают счётчики без COUNT"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertEqual(response.context['post_count'], 1)
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, '<span>1</span>')
@@ -0,0 +1,196 @@
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..feed import AuthorMergeFeed, FeedPaginator, FollowFeed
+from ..models import AuthorStats, Follow, Post, TimelineEntry, User
+from ..paginator import next_cursor, previous_cursor
+
+PULL_THRESHOLD = 3
+PUSH_THRESHOLD = 2
+POSTS_ON_PAGE = 10
+
+
+@override_settings(FEED_PULL_FOLLOWERS_THRESHOLD=PULL_THRESHOLD,
+                   FEED_PUSH_FOLLOWERS_THRESHOLD=PUSH_THRESHOLD,
+                   TIMELINE_WORKERS=0)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other_reader')
+        cls.third_reader = User.objects.create_user(username='third_reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        for reader in (self.reader, self.other_reader, self.third_reader):
+            Follow.objects.create(user=reader, author=self.star)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def create_posts(self, author, count):
+        return [Post.objects.create(author=author, text=f'Пост {i}')
+                for i in range(count)]
+
+    def test_popular_author_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются, но есть в ленте"""
+        pushed = self.create_posts(self.author, 2)
+        pulled = self.create_posts(self.star, 3)
+        self.assertFalse(TimelineEntry.objects.filter(author=self.star))
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(list(page), (pushed + pulled)[::-1])
+        self.assertEqual(page.feed_stats.pushed, 2)
+        self.assertEqual(page.feed_stats.pulled, 3)
+        self.assertEqual(page.feed_stats.pulled_authors, 1)
+
+    def star_entries(self):
+        return set(TimelineEntry.objects.filter(
+            user=self.reader, author=self.star
+        ).values_list('post_id', flat=True))
+
+    def assert_feed(self, posts):
+        feed = FeedPaginator(FollowFeed(self.reader), POSTS_ON_PAGE)
+        self.assertEqual(list(feed.get_page(1)), posts)
+
+    def test_threshold_crossing(self):
+        """Автор, пересёкший порог, не пропадает из ленты ни в одну сторону,
+        а между порогами режим не меняется"""
+        posts = self.create_posts(self.star, 3)[::-1]
+        Follow.objects.filter(user=self.third_reader).delete()
+        self.assertFalse(self.star_entries())
+        self.assert_feed(posts)
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertEqual(self.star_entries(), {post.id for post in posts})
+        self.assert_feed(posts)
+        Follow.objects.create(user=self.other_reader, author=self.star)
+        self.assertEqual(self.star_entries(), {post.id for post in posts})
+        Follow.objects.create(user=self.third_reader, author=self.star)
+        self.assertFalse(TimelineEntry.objects.filter(author=self.star))
+        self.assert_feed(posts)
+
+    def test_drifted_counter_switches(self):
+        """Режим сверяется с порогом неравенством, а не точным числом"""
+        self.create_posts(self.star, 2)
+        AuthorStats.objects.filter(user=self.star).update(followers_count=1)
+        Follow.objects.filter(user=self.third_reader).delete()
+        self.assertFalse(AuthorStats.objects.get(user=self.star).pulled)
+        self.assertEqual(len(self.star_entries()), 2)
+
+    @override_settings(FEED_OFFSET_PAGES=1)
+    def test_switch_back_fills_window_only(self):
+        """Обратно раскладываются только посты окна ленты"""
+        posts = self.create_posts(self.star, POSTS_ON_PAGE + 3)[::-1]
+        Follow.objects.filter(user__in=(self.other_reader,
+                                        self.third_reader)).delete()
+        self.assertEqual(self.star_entries(),
+                         {post.id for post in posts[:POSTS_ON_PAGE]})
+
+    @override_settings(TIMELINE_WORKERS=1)
+    def test_switch_waits_for_commit(self):
+        """Перевод с пулом не выполняется внутри запроса"""
+        self.create_posts(self.star, 2)
+        with mock.patch('posts.timeline._submit') as submit:
+            Follow.objects.filter(user=self.third_reader).delete()
+            Follow.objects.filter(user=self.other_reader).delete()
+        submit.assert_not_called()
+        self.assertFalse(self.star_entries())
+        self.assertTrue(AuthorStats.objects.get(user=self.star).pulled)
+
+    def test_merged_feed_cursor_pages(self):
+        """Курсоры листают объединённую ленту без повторов и пропусков"""
+        posts = self.create_posts(self.author, 7)
+        posts += self.create_posts(self.star, 8)
+        posts += self.create_posts(self.author, 6)
+        paginator = FeedPaginator(FollowFeed(self.reader), POSTS_ON_PAGE)
+        page = paginator.get_page(1)
+        seen = list(page)
+        while page.has_next():
+            page = paginator.cursor_page(after=next_cursor(page))
+            seen.extend(page)
+        self.assertEqual(seen, posts[::-1])
+        self.assertEqual(paginator.count, len(posts))
+
+    def test_cursor_page_is_lazy(self):
+        """Страница по курсору читает ленту только при обращении к ней"""
+        self.create_posts(self.author, POSTS_ON_PAGE + 2)
+        paginator = FeedPaginator(FollowFeed(self.reader), POSTS_ON_PAGE)
+        cursor = next_cursor(paginator.get_page(1))
+        with self.assertNumQueries(0):
+            page = paginator.cursor_page(after=cursor)
+        self.assertEqual(page.feed_stats.pushed, 2)
+
+    def test_duplicates_are_dropped(self):
+        """Пост, попавший и в ленту, и в выборку автора, показан один раз"""
+        post, = self.create_posts(self.star, 1)
+        TimelineEntry.objects.create(user=self.reader, post=post,
+                                     author=self.star, pub_date=post.pub_date)
+        paginator = FeedPaginator(FollowFeed(self.reader), POSTS_ON_PAGE)
+        page = paginator.get_page(1)
+        self.assertEqual(list(page), [post])
+        self.assertEqual(page.feed_stats.duplicates, 1)
+        self.assertEqual(paginator.count, 1)
+
+    @override_settings(FEED_OFFSET_PAGES=2)
+    def test_offset_pages_are_capped(self):
+        """Глубокие номера страниц не читаются, дальше ведут курсоры"""
+        posts = self.create_posts(self.author, POSTS_ON_PAGE * 3)[::-1]
+        paginator = FeedPaginator(FollowFeed(self.reader), POSTS_ON_PAGE)
+        page = paginator.get_page(3)
+        self.assertEqual(paginator.last_number, 2)
+        self.assertEqual(list(page), posts[POSTS_ON_PAGE:POSTS_ON_PAGE * 2])
+        self.assertTrue(page.has_next())
+        page = paginator.cursor_page(after=next_cursor(page))
+        self.assertEqual(list(page), posts[POSTS_ON_PAGE * 2:])
+
+
+@override_settings(FOLLOW_FEED_ENGINE='kway')
+class AuthorMergeFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='kway_reader')
+        cls.authors = [User.objects.create_user(username=f'kway_author_{i}')
+                       for i in range(12)]
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author)
+            for author in cls.authors[:-1]
+        )
+        cls.posts = [
+            Post.objects.create(author=cls.authors[i % 12], text=f'Пост {i}')
+            for i in range(40)
+        ]
+
+    def setUp(self):
+        self.paginator = FeedPaginator(AuthorMergeFeed(self.reader),
+                                       POSTS_ON_PAGE)
+
+    def expected(self):
+        followed = self.authors[:-1]
+        return [post for post in self.posts[::-1] if post.author in followed]
+
+    def test_cursor_pages_match_join(self):
+        """Слияние по авторам выдаёт ту же ленту, что и JOIN"""
+        page = self.paginator.get_page(1)
+        seen = list(page)
+        while page.has_next():
+            page = self.paginator.cursor_page(after=next_cursor(page))
+            self.assertLessEqual(page.feed_stats.scans, POSTS_ON_PAGE + 1)
+            seen.extend(page)
+        self.assertEqual(seen, self.expected())
+        back = self.paginator.cursor_page(before=previous_cursor(page))
+        self.assertEqual(list(back), self.expected()[-17:-7])
+
+    def test_follow_index_uses_configured_engine(self):
+        """Лента подписок строится выбранным в настройках движком"""
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIsInstance(response.context['page_obj'].paginator
+                              .object_list, AuthorMergeFeed)
+        self.assertEqual(list(response.context['page_obj']),
+                         self.expected()[:POSTS_ON_PAGE])
@@ -20,6 +20,9 @@ SMALL_GIF = (
     b'\x0A\x00\x3B'
 )
 
+# Картинки хранятся по хешу содержимого в каталогах из его первых знаков.
+STORED_GIF = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormTests(TestCase):
@@ -88,7 +91,7 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author, self.post_author)
         self.assertEqual(post.group_id, form_data['group'])
-        self.assertEqual(post.image.name, 'posts/small.gif')
+        self.assertRegex(post.image.name, STORED_GIF)
 
     def test_authorized_user_edit_post(self):
         """Проверка редактирования поста авторизованным пользователем."""
@@ -124,7 +127,8 @@ class PostFormTests(TestCase):
         self.assertEqual(created_post.author, post.author)
         self.assertEqual(created_post.group_id, form_data['group'])
         self.assertEqual(created_post.pub_date, post.pub_date)
-        self.assertEqual(created_post.image.name, 'posts/other_small.gif')
+        self.assertRegex(created_post.image.name, STORED_GIF)
+        self.assertNotEqual(created_post.image.name, post.image.name)
 
     def test_nonauthorized_user_create_post(self):
         """Проверка создания поста неавторизованным пользователем."""
@@ -0,0 +1,177 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post, User
+from ..uploads import LimitedUploadHandler
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Теги EXIF: производитель камеры и поворот снимка.
+MAKE = 0x010F
+ORIENTATION = 0x0112
+
+STORED_JPEG = r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
+
+
+def photo(size=(1200, 400), orientation=None, image_format='JPEG'):
+    image = Image.new('RGB', size, (200, 100, 50))
+    exif = Image.Exif()
+    exif[MAKE] = 'Телефон'
+    if orientation:
+        exif[ORIENTATION] = orientation
+    content = BytesIO()
+    image.save(content, image_format, exif=exif.tobytes())
+    return content.getvalue()
+
+
+def encoded(image, image_format, **options):
+    content = BytesIO()
+    image.save(content, image_format, **options)
+    return content.getvalue()
+
+
+def upload(content, name='photo.jpg'):
+    return SimpleUploadedFile(name, content, 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=300)
+class IngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def clean(self, content):
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': upload(content)})
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    def test_downscaled_and_stripped(self):
+        """Большая картинка уменьшается и теряет EXIF"""
+        image = self.clean(photo())
+        self.assertEqual(image.size, (300, 100))
+        self.assertEqual(len(image.getexif()), 0)
+
+    def test_exif_orientation_applied(self):
+        """Поворот из EXIF применяется к пикселям"""
+        image = self.clean(photo(orientation=6))
+        self.assertEqual(image.size, (100, 300))
+
+    def test_small_image_not_upscaled(self):
+        """Картинка меньше предела не растягивается"""
+        image = self.clean(photo(size=(120, 40)))
+        self.assertEqual(image.size, (120, 40))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_byte_limit(self):
+        """Файл тяжелее предела отклоняется"""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': upload(photo(size=(2000, 2000)))})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_upload_handler_drops_oversized_file(self):
+        """Куски сверх предела не передаются дальше при разборе запроса"""
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        self.assertEqual(handler.receive_data_chunk(b'x' * 600, 0),
+                         b'x' * 600)
+        self.assertIsNone(handler.receive_data_chunk(b'x' * 600, 600))
+        dropped = handler.file_complete(1200)
+        self.assertEqual(dropped.size, 1200)
+        self.assertEqual(dropped.read(), b'')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_oversized_upload_rejected(self):
+        """Пост со слишком большим файлом не создаётся"""
+        response = self.client.post(reverse('posts:post_create'), data={
+            'text': 'Тяжёлый пост',
+            'image': upload(photo(size=(2000, 2000)), name='big.jpg'),
+        })
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'file_too_large')
+        self.assertFalse(Post.objects.filter(text='Тяжёлый пост').exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10000)
+    def test_pixel_limit(self):
+        """Холст больше предела отклоняется до распаковки"""
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': upload(photo(size=(200, 100)))})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'too_many_pixels')
+
+    def test_other_formats_converted(self):
+        """BMP становится JPEG, TIFF с прозрачностью — PNG"""
+        cases = (
+            ('scan.bmp', Image.new('RGB', (1200, 400)), 'BMP', 'JPEG'),
+            ('scan.tiff', Image.new('RGBA', (1200, 400)), 'TIFF', 'PNG'),
+        )
+        for name, image, source_format, image_format in cases:
+            with self.subTest(source_format=source_format):
+                form = PostForm(data={'text': 'Пост'}, files={
+                    'image': upload(encoded(image, source_format), name)})
+                self.assertTrue(form.is_valid(), form.errors)
+                stored = form.cleaned_data['image']
+                self.assertEqual(
+                    stored.name,
+                    name.split('.')[0] + ('.png' if image_format == 'PNG'
+                                          else '.jpg'))
+                converted = Image.open(stored)
+                self.assertEqual(converted.format, image_format)
+                self.assertEqual(converted.size, (300, 100))
+
+    def test_animation_rejected(self):
+        """Анимированная картинка отклоняется"""
+        frames = [Image.new('P', (10, 10), color) for color in (1, 2)]
+        content = encoded(frames[0], 'GIF', save_all=True,
+                          append_images=frames[1:])
+        form = PostForm(data={'text': 'Пост'},
+                        files={'image': upload(content, 'anim.gif')})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'animated_image')
+
+    def test_truncated_image_rejected(self):
+        """Обрезанный JPEG отклоняется ошибкой формы, а не падением"""
+        content = photo()
+        response = self.client.post(reverse('posts:post_create'), data={
+            'text': 'Обрезанный пост',
+            'image': upload(content[:len(content) // 2], name='cut.jpg'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['form'].errors.as_data()['image'][0].code,
+            'invalid_image')
+        self.assertFalse(Post.objects.filter(text='Обрезанный пост').exists())
+
+    def test_create_stores_downscaled_image(self):
+        """post_create сохраняет уменьшенную картинку"""
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото',
+            'image': upload(photo(), name='big.jpg'),
+        })
+        post = Post.objects.get(text='Пост с фото')
+        self.assertRegex(post.image.name, STORED_JPEG)
+        self.assertEqual((post.image.width, post.image.height), (300, 100))
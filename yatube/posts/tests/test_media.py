@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import media, thumbnails
+from ..models import MediaFile, Post, User
+from ..storage import is_sharded, post_images
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        patcher = mock.patch.object(media.transaction, 'on_commit',
+                                    side_effect=lambda callback: callback())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, name='meme.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Мем', author=self.author,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def refs(self, name):
+        return MediaFile.objects.get(name=name).refs
+
+    def test_duplicates_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом с общими миниатюрами"""
+        first = self.create('meme.gif')
+        second = self.create('MEME_copy.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first.image.name), 2)
+        thumbnails.generate(first.pk)
+        self.assertIsNotNone(thumbnails.ready_variants(second))
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется только вместе с последним ссылающимся постом"""
+        first = self.create()
+        second = self.create()
+        name = first.image.name
+        thumbnails.generate(first.pk)
+        thumbnail = thumbnails.ready_variants(first)['src']
+        first.delete()
+        self.assertTrue(post_images.exists(name))
+        second.delete()
+        self.assertFalse(post_images.exists(name))
+        self.assertFalse(thumbnail.exists())
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_purge_spares_file_saved_again(self):
+        """Файл, который снова сохранили для нового поста, не удаляется"""
+        post = self.create()
+        name = post.image.name
+        with mock.patch.object(media.transaction, 'on_commit'):
+            post.delete()
+        self.assertEqual(post_images.save('posts/again.gif',
+                                          ContentFile(SMALL_GIF)), name)
+        media.purge(name)
+        self.assertTrue(post_images.exists(name))
+        media.retain(name)
+        self.assertEqual(self.refs(name), 1)
+
+    def test_replaced_image_released(self):
+        """Замена картинки снимает ссылку со старого файла"""
+        post = self.create()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00',
+                                        'image/gif')
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post_images.exists(old_name))
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_shard_images_moves_flat_files(self):
+        """shard_images переносит плоские файлы и переписывает посты"""
+        FileSystemStorage().save('posts/legacy.gif', ContentFile(SMALL_GIF))
+        posts = [Post.objects.create(text='Старый пост', author=self.author,
+                                     image='posts/legacy.gif')
+                 for _ in range(2)]
+        Post.objects.create(text='Без файла', author=self.author,
+                            image='posts/missing.gif')
+        stdout, stderr = StringIO(), StringIO()
+        call_command('shard_images', '--batch-size=1', stdout=stdout,
+                     stderr=stderr)
+        names = {Post.objects.get(pk=post.pk).image.name for post in posts}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_sharded(name))
+        self.assertTrue(post_images.exists(name))
+        self.assertFalse(post_images.exists('posts/legacy.gif'))
+        self.assertEqual(self.refs(name), 2)
+        self.assertFalse(
+            MediaFile.objects.filter(name='posts/legacy.gif').exists())
+        self.assertIn('posts/missing.gif', stderr.getvalue())
+        self.assertIn('Перенесено файлов: 1, постов: 2, ошибок: 1',
+                      stdout.getvalue())
@@ -0,0 +1,160 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import AuthorStats, Group, Post, User
+from ..paginator import (CursorPage, CursorPaginator, next_cursor,
+                         page_window, previous_cursor)
+
+POSTS_COUNT = 25
+POSTS_ON_PAGE = 10
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cursor-slug',
+            description='Тестовое описание группы',
+        )
+        Post.objects.bulk_create([
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_COUNT)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.paginator = CursorPaginator(Post.objects.all(), POSTS_ON_PAGE)
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Проход по курсорам выдаёт все посты без повторов"""
+        page = self.paginator.get_page(1)
+        seen = list(page)
+        while page.has_next():
+            page = self.paginator.cursor_page(after=next_cursor(page))
+            self.assertIsInstance(page, CursorPage)
+            seen.extend(page)
+        self.assertEqual(seen, list(Post.objects.order_by('-pub_date',
+                                                          '-id')))
+
+    def test_before_cursor_returns_previous_page(self):
+        """Курсор before возвращает предыдущую страницу"""
+        first = self.paginator.get_page(1)
+        second = self.paginator.cursor_page(after=next_cursor(first))
+        back = self.paginator.cursor_page(before=previous_cursor(second))
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        page = self.paginator.cursor_page(after='not-a-cursor')
+        self.assertEqual(page.number, 1)
+
+    def test_cursor_page_query_count(self):
+        """Страница по курсору строится одним запросом без COUNT"""
+        cursor = next_cursor(self.paginator.get_page(1))
+        with self.assertNumQueries(1):
+            list(self.paginator.cursor_page(after=cursor))
+
+    def test_count_cached_by_scope(self):
+        """Число постов берётся из кеша до записи в области"""
+        paginator = CursorPaginator(Post.objects.all(), POSTS_ON_PAGE,
+                                    count_scopes=('posts',))
+        self.assertEqual(paginator.count, POSTS_COUNT)
+        with self.assertNumQueries(0):
+            CursorPaginator(Post.objects.all(), POSTS_ON_PAGE,
+                            count_scopes=('posts',)).count
+        Post.objects.create(text='Ещё пост', author=self.user)
+        paginator = CursorPaginator(Post.objects.all(), POSTS_ON_PAGE,
+                                    count_scopes=('posts',))
+        self.assertEqual(paginator.count, POSTS_COUNT + 1)
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=POSTS_COUNT)
+    def test_large_count_becomes_approximate(self):
+        """После записи большое число берётся из последнего известного"""
+        self.assertEqual(self.scoped_paginator().count, POSTS_COUNT)
+        Post.objects.create(text='Ещё пост', author=self.user)
+        with self.assertNumQueries(0):
+            paginator = self.scoped_paginator()
+            self.assertEqual(paginator.count, POSTS_COUNT)
+        self.assertTrue(paginator.count_is_approximate)
+        self.assertEqual(paginator.count_label, 'около 25')
+        cache.delete('count:posts:latest')
+        self.assertEqual(self.scoped_paginator().count, POSTS_COUNT + 1)
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=POSTS_COUNT + 100)
+    def test_small_count_stays_exact(self):
+        """Небольшое число пересчитывается точно после каждой записи"""
+        self.assertEqual(self.scoped_paginator().count, POSTS_COUNT)
+        Post.objects.create(text='Ещё пост', author=self.user)
+        paginator = self.scoped_paginator()
+        self.assertEqual(paginator.count, POSTS_COUNT + 1)
+        self.assertEqual(paginator.count_label, str(POSTS_COUNT + 1))
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=10)
+    def test_profile_count_from_author_stats(self):
+        """Профиль оценивает число постов по счётчику автора без COUNT"""
+        AuthorStats.objects.filter(user=self.user).update(
+            posts_count=POSTS_COUNT)
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': self.user}))
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.count_is_approximate)
+        self.assertContains(response, 'Постов: около')
+
+    def test_page_window(self):
+        """Окно страниц: края, соседи текущей и пропуски"""
+        cases = {
+            (1, 3): [1, 2, 3],
+            (1, 100): [1, 2, 3, None, 100],
+            (50, 100): [1, None, 48, 49, 50, 51, 52, None, 100],
+            (5, 10): [1, 2, 3, 4, 5, 6, 7, None, 10],
+        }
+        for (number, total), expected in cases.items():
+            with self.subTest(number=number, total=total):
+                page = Paginator(range(total), 1).page(number)
+                self.assertEqual(page_window(page), expected)
+
+    @override_settings(APPROXIMATE_COUNT_THRESHOLD=1)
+    def test_paginator_html_size_does_not_depend_on_pages(self):
+        """Размер HTML пагинатора не растёт с числом страниц"""
+        sizes = []
+        for total in (10 ** 3, 10 ** 6):
+            cache.clear()
+            paginator = CursorPaginator(Post.objects.all(), POSTS_ON_PAGE,
+                                        count_scopes=('posts',),
+                                        count_estimate=lambda: total)
+            html = render_to_string('posts/includes/paginator.html',
+                                    {'page_obj': paginator.get_page(2)})
+            sizes.append(len(html))
+        self.assertLess(sizes[1] - sizes[0], 50)
+
+    def scoped_paginator(self):
+        return CursorPaginator(Post.objects.all(), POSTS_ON_PAGE,
+                               count_scopes=('posts',))
+
+    def test_views_render_cursor_links(self):
+        """Ленты отдают ссылки вперёд по курсору и принимают ?page=N"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                cursor = next_cursor(response.context['page_obj'])
+                self.assertContains(response, f'?after={cursor}')
+                response = self.guest_client.get(f'{url}?after={cursor}')
+                self.assertEqual(len(response.context['page_obj']),
+                                 POSTS_ON_PAGE)
+                response = self.guest_client.get(f'{url}?page=3')
+                self.assertEqual(len(response.context['page_obj']),
+                                 POSTS_COUNT - 2 * POSTS_ON_PAGE)
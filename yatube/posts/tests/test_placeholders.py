@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def photo(size=(1200, 400)):
+    content = BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(content, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', content.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PlaceholderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_placeholder_computed_on_upload(self):
+        """При загрузке сохраняются крошечная заглушка и размеры картинки"""
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото', 'image': photo(),
+        })
+        post = Post.objects.get(text='Пост с фото')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,'))
+        self.assertLess(len(post.image_placeholder), 500)
+        self.assertEqual((post.image_width, post.image_height), (1200, 400))
+
+    def test_placeholder_inlined_in_feed(self):
+        """Лента встраивает заглушку и резервирует место под картинку"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=photo())
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image_placeholder)
+        self.assertContains(response, 'height="339"')
+
+    def test_placeholder_cleared_with_image(self):
+        """Без картинки нет и заглушки"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=photo())
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_placeholder, '')
+        self.assertIsNone(post.image_width)
+
+    def test_detail_page_keeps_image_proportions(self):
+        """Страница поста показывает картинку целиком в её пропорциях"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=photo(size=(600, 800)))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'width="600" height="800"')
+
+    def test_backfill_command(self):
+        """Команда досчитывает заглушки постов, загруженных без них"""
+        posts = [Post.objects.create(text='Пост', author=self.author,
+                                     image=photo()) for _ in range(2)]
+        Post.objects.update(image_placeholder='', image_width=None,
+                            image_height=None)
+        stdout = StringIO()
+        call_command('backfill_placeholders', stdout=stdout)
+        for post in posts:
+            post.refresh_from_db()
+            self.assertTrue(post.image_placeholder)
+            self.assertEqual((post.image_width, post.image_height),
+                             (1200, 400))
+        self.assertIn('файлов 1, постов 2', stdout.getvalue())
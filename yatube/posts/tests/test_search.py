@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def post(self, text):
+        return Post.objects.create(text=text, author=self.author)
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_ranked_by_relevance(self):
+        """Пост, где слово встречается чаще, выше в выдаче"""
+        once = self.post('Кошка сидит на окне, а собака спит')
+        twice = self.post('Кошка и ещё раз кошка')
+        self.post('Про собак')
+        self.assertEqual(self.found('КОШКА'), [twice, once])
+
+    def test_prefix_and_all_words(self):
+        """Ищутся все слова сразу, последнее — по началу"""
+        post = self.post('Красная машина едет быстро')
+        self.post('Красная площадь')
+        self.assertEqual(self.found('красная маши'), [post])
+
+    def test_operators_in_query_are_words(self):
+        """Кавычки и операторы FTS5 в запросе не ломают поиск"""
+        post = self.post('NOT OR AND')
+        self.assertEqual(self.found('"NOT" (OR'), [post])
+        self.assertEqual(self.found('***'), [])
+
+    def test_index_follows_bulk_changes(self):
+        """Триггеры обновляют индекс и при update(), и при удалении"""
+        post = self.post('Старый текст')
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новый'), [post])
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(self.found('новый'), [])
+
+    def test_paginated(self):
+        """Выдача делится на страницы"""
+        for number in range(12):
+            self.post(f'Пост про погоду {number}')
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'погоду', 'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу"""
+        post = self.post('Уникальное слово')
+        self.post('Другое')
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'уникальное'})
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        self.assertIn('posts_post_fts',
+                      str(response.context['cl'].queryset.query))
+
+    def test_rebuild_command_restores_index(self):
+        """rebuild_search_index восстанавливает триггеры и индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        post = self.post('Пропущенный пост')
+        self.assertEqual(self.found('пропущенный'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('пропущенный'), [post])
+        other = self.post('Новый пропущенный')
+        self.assertCountEqual(self.found('пропущенный'), [post, other])
+
+    def test_triggers_restored_after_migrate(self):
+        """После migrate удалённые триггеры создаются заново"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_update')
+        post = self.post('Первый вариант')
+        Post.objects.filter(pk=post.pk).update(text='Второй вариант')
+        self.assertFalse(search.installed())
+        search.reinstall(apps.get_app_config('posts'))
+        self.assertTrue(search.installed())
+        self.assertEqual(self.found('второй'), [post])
+        self.assertEqual(self.found('первый'), [])
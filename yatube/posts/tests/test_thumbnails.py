@@ -0,0 +1,330 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageDraw
+
+from .. import kvstore, thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        kvstore.local.clear()
+        self.client = Client()
+
+    def test_fallback_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, показывается исходная картинка"""
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+        enqueue.assert_called_once()
+        thumbnails.generate(self.post.pk)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.image.url)
+        thumbnail = thumbnails.ready_variants(self.post)['src']
+        self.assertContains(response, thumbnail.url)
+
+    def test_create_enqueues_generation(self):
+        """Новый пост с картинкой ставит нарезку миниатюр в пул"""
+        client = Client()
+        client.force_login(self.author)
+        with mock.patch.object(thumbnails, '_submit') as submit, \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda callback: callback()):
+            client.post(reverse('posts:post_create'), data={
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile('new.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+        post = Post.objects.get(text='Новый пост')
+        submit.assert_called_once_with(post.pk)
+
+    def test_ready_variants_served_from_memory(self):
+        """Повторный поиск миниатюр не ходит ни в кеш, ни в базу"""
+        thumbnails.generate(self.post.pk)
+        kvstore.local.clear()
+        cache.clear()
+        self.assertIsNotNone(thumbnails.ready_variants(self.post))
+        misses = kvstore.stats()['misses']
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(thumbnails.ready_variants(self.post))
+        self.assertEqual(kvstore.stats()['misses'], misses)
+        self.assertGreater(kvstore.stats()['hits'], 0)
+
+    def test_failed_image_is_not_retried_on_every_render(self):
+        """Картинка, которую не удалось нарезать, не ставится в пул заново"""
+        with mock.patch.object(thumbnails, 'get_thumbnail',
+                               side_effect=OSError), \
+                self.assertRaises(OSError):
+            thumbnails.generate(self.post.pk)
+        with mock.patch.object(thumbnails, '_submit') as submit, \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda callback: callback()):
+            self.client.get(reverse('posts:index'))
+        submit.assert_not_called()
+
+    def test_generation_is_single_flight(self):
+        """Картинку, которую уже режет другой процесс, повторно не режут"""
+        cache.add(f'thumbnail:{self.post.image.name}:lock', 1)
+        with mock.patch.object(thumbnails, 'get_thumbnail') as cut:
+            thumbnails.generate(self.post.pk)
+        cut.assert_not_called()
+
+
+def png(shade):
+    """Крошечный PNG: разные оттенки — разные файлы в хранилище."""
+    content = BytesIO()
+    Image.new('L', (2, 1), shade).save(content, 'PNG')
+    return content.getvalue()
+
+
+def sample_photo(width=1920, height=1080):
+    """JPEG с плавными переходами и фигурами, похожий на фотографию."""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for step in range(0, width, 120):
+        draw.ellipse((step, step % height, step + 200, step % height + 150),
+                     fill=(step % 255, 120, 255 - step % 255))
+    content = BytesIO()
+    image.save(content, 'JPEG', quality=90)
+    return content.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class VariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            text='Пост с фотографией',
+            author=cls.author,
+            image=SimpleUploadedFile('photo.jpg', sample_photo(),
+                                     'image/jpeg'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        kvstore.local.clear()
+        thumbnails.generate(self.post.pk)
+
+    def size(self, geometry, image_format):
+        thumbnail = thumbnails.backend.get_ready_thumbnail(
+            self.post.image, geometry, crop='center', upscale=True,
+            format=image_format)
+        return thumbnail.storage.size(thumbnail.name)
+
+    def test_page_renders_srcset(self):
+        """Карточка отдаёт WebP и JPEG в нескольких ширинах через srcset"""
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        for width in thumbnails.VARIANT_WIDTHS:
+            self.assertContains(response, f'.webp {width}w')
+            self.assertContains(response, f'.jpg {width}w')
+
+    def test_detail_page_renders_full_srcset(self):
+        """Страница поста отдаёт картинку целиком в нескольких ширинах"""
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertNotContains(response, f'src="{self.post.image.url}"')
+        for width in thumbnails.FULL_WIDTHS:
+            self.assertContains(response, f'.webp {width}w')
+            self.assertContains(response, f'.jpg {width}w')
+        full = thumbnails.ready_variants(self.post, full=True)['src']
+        self.assertEqual((full.width, full.height), (1600, 900))
+
+    def test_webp_is_smaller_than_jpeg(self):
+        """WebP каждой ширины легче JPEG той же ширины"""
+        for width in thumbnails.VARIANT_WIDTHS:
+            geometry = thumbnails.variant_geometry(width)
+            with self.subTest(width=width):
+                self.assertLess(self.size(geometry, 'WEBP'),
+                                self.size(geometry, 'JPEG'))
+
+    def test_mobile_variant_saves_bytes(self):
+        """Узкий WebP для телефона как минимум вчетверо легче 960px JPEG"""
+        mobile = self.size(thumbnails.variant_geometry(480), 'WEBP')
+        desktop = self.size('960x339', 'JPEG')
+        self.assertLess(mobile * 4, desktop)
+
+
+class LocalCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        """Сверх размера вытесняется запись, которую давно не читали"""
+        local = kvstore.LocalCache(size=2, timeout=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a', load=lambda: None)
+        local.set('c', 3)
+        self.assertEqual(local.get('a', load=lambda: 'загружено'), 1)
+        self.assertEqual(local.get('b', load=lambda: 'загружено'),
+                         'загружено')
+        self.assertEqual(local.stats()['size'], 2)
+
+    def test_entries_expire(self):
+        """Записи старше срока загружаются заново"""
+        local = kvstore.LocalCache(size=10, timeout=60)
+        local.set('a', 1)
+        with mock.patch.object(kvstore.time, 'monotonic',
+                               return_value=time.monotonic() + 61):
+            self.assertEqual(local.get('a', load=lambda: 2), 2)
+
+    def test_concurrent_misses_load_once(self):
+        """Одновременные промахи по одному ключу загружают его один раз"""
+        local = kvstore.LocalCache(size=10, timeout=60)
+        loads = []
+        started = threading.Event()
+
+        def load():
+            loads.append(1)
+            started.set()
+            time.sleep(0.1)
+            return 'значение'
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(local.get('a', load)))
+            for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(loads, [1])
+        self.assertEqual(results, ['значение'] * 5)
+        self.assertEqual(local.stats()['misses'], 5)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class RegenerateThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=cls.author,
+                image=SimpleUploadedFile(f'backfill{number}.png',
+                                         png(number), 'image/png'),
+            )
+            for number in range(3)
+        ]
+        cls.missing = Post.objects.create(text='Без файла', author=cls.author,
+                                          image='posts/missing.gif')
+        cls.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        kvstore.local.clear()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def regenerate(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('regenerate_thumbnails', '--workers=1',
+                     f'--checkpoint={self.checkpoint}', *args,
+                     stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def ready(self, post):
+        return thumbnails.ready_variants(post)
+
+    def test_backfill_reports_failures(self):
+        """Команда нарезает миниатюры и сообщает об отсутствующих файлах"""
+        stdout, stderr = self.regenerate('--chunk-size=2')
+        for post in self.posts:
+            self.assertIsNotNone(self.ready(post))
+        self.assertIn(f'Пост {self.missing.pk}', stderr)
+        self.assertIn('ошибок: 1', stdout)
+        self.assertIn('картинок/с', stdout)
+        self.assertIn(f'Повторить: --posts {self.missing.pk}', stderr)
+
+    def test_only_given_posts(self):
+        """С --posts нарезаются картинки только этих постов"""
+        with mock.patch.object(thumbnails, 'enqueue'):
+            stdout, stderr = self.regenerate('--posts', str(self.posts[1].pk))
+            self.assertIsNone(self.ready(self.posts[0]))
+            self.assertIsNotNone(self.ready(self.posts[1]))
+        self.assertIn('Готово: 1 картинок', stdout)
+
+    def test_given_posts_keep_checkpoint(self):
+        """Запуск с --posts не сдвигает контрольную точку полного"""
+        with open(self.checkpoint, 'w') as checkpoint:
+            checkpoint.write(str(self.posts[0].pk))
+        self.regenerate('--posts', str(self.posts[2].pk))
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(checkpoint.read(), str(self.posts[0].pk))
+
+    def test_shared_file_cut_once(self):
+        """Файл нескольких постов режется один раз"""
+        shared = Post.objects.create(text='Тот же файл', author=self.author,
+                                     image=self.posts[0].image.name)
+        with mock.patch('posts.management.commands.regenerate_thumbnails.'
+                        'regenerate') as regenerate:
+            self.regenerate('--posts', str(self.posts[0].pk), str(shared.pk))
+        regenerate.assert_called_once_with(self.posts[0].image.name, False)
+
+    def test_resume_from_checkpoint(self):
+        """Повторный запуск продолжает с контрольной точки"""
+        with open(self.checkpoint, 'w') as checkpoint:
+            checkpoint.write(str(self.posts[1].pk))
+        with mock.patch.object(thumbnails, 'enqueue'):
+            stdout, stderr = self.regenerate()
+            self.assertIsNone(self.ready(self.posts[0]))
+            self.assertIsNotNone(self.ready(self.posts[2]))
+        self.assertIn('Готово: 2 картинок', stdout)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(checkpoint.read(), str(self.missing.pk))
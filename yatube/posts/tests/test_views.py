@@ -1,8 +1,10 @@
 from django import forms
 from django.test import Client, TestCase
 from django.urls import reverse
+from django.utils import timezone
 from django.core.cache import cache
 
+from core.cache import bump
 
 from ..models import Group, Post, User, Comment, Follow
 
@@ -29,6 +31,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -121,6 +124,7 @@ class PostPagesTests(TestCase):
                               get(value))
                 self.assertIsInstance(form_field, expected)
 
+        cache.clear()
         response = self.authorized_client.get(
             reverse(
                 'posts:post_detail', kwargs={'post_id': self.post.pk}
@@ -205,17 +209,76 @@ class PostPagesTests(TestCase):
     def test_cache_work(self):
         """"Проверка корректности кеширования"""
         response = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.all().delete()
-        response_after_delete_post = self.authorized_client.get(reverse
-                                                                ('posts:index')
-                                                                )
-        self.assertEqual(response.content, response_after_delete_post.content)
+        Post.objects.update(text='Текст, изменённый в обход сигналов')
+        response_after_update = self.authorized_client.get(
+            reverse('posts:index'))
+        self.assertEqual(response.content, response_after_update.content)
         cache.clear()
         response_after_cache_clear = (self.authorized_client.get
                                       (reverse('posts:index')))
         self.assertNotEqual(response.content,
                             response_after_cache_clear.content)
 
+    def test_cache_invalidated_on_changes(self):
+        """Изменения постов, комментариев и групп сразу видны в лентах"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        changes = (
+            lambda: Post.objects.create(text='Свежий пост', author=self.user,
+                                        group=self.group),
+            lambda: Comment.objects.create(post=self.post, author=self.user,
+                                           text='Комментарий'),
+            lambda: Group.objects.filter(pk=self.group.pk).get().save(),
+            lambda: Post.objects.filter(text='Свежий пост').delete(),
+        )
+        for number, change in enumerate(changes):
+            for url in urls:
+                self.authorized_client.get(url)
+            text = f'Текст {number}, изменённый в обход сигналов'
+            Post.objects.exclude(text='Свежий пост').update(
+                text=text, updated=timezone.now())
+            change()
+            for url in urls:
+                with self.subTest(url=url, change=number):
+                    self.assertContains(self.authorized_client.get(url), text)
+
+    def test_group_change_invalidates_only_its_scope(self):
+        """Пост в другой группе не сбрасывает кеш чужой группы"""
+        other = Group.objects.create(title='Другая', slug='other-slug',
+                                     description='Другая группа')
+        url = reverse('posts:group_posts', kwargs={'slug': self.group.slug})
+        self.authorized_client.get(url)
+        Post.objects.update(text='Текст, изменённый в обход сигналов')
+        Post.objects.create(text='Пост', author=self.user, group=other)
+        self.assertNotContains(self.authorized_client.get(url),
+                               'Текст, изменённый в обход сигналов')
+
+    def test_post_card_cache(self):
+        """Карточка берётся из кеша, пока пост не изменён"""
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        Post.objects.update(text='Текст, изменённый в обход сигналов')
+        bump('posts')
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, 'Текст, изменённый в обход сигналов')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Текст, изменённый в обход сигналов')
+
+    def test_follow_page_cache(self):
+        """Подписка сразу меняет закешированную ленту подписок"""
+        reader = User.objects.create_user(username='cache_reader')
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:follow_index')
+        empty = client.get(url).content
+        Follow.objects.create(user=reader, author=self.user)
+        self.assertNotEqual(client.get(url).content, empty)
+
 
 FIRST_POST = 1
 FINAL_POST = 16
@@ -280,8 +343,8 @@ class PaginatorTests(TestCase):
         self.assertEqual(len
                          (response_first.context['page_obj']),
                          POSTS_ON_FIRST_PAGE)
-        self.assertNotEqual(len(response_second.context['page_obj']),
-                            POSTS_ON_FINAL_PAGE)
+        self.assertEqual(len(response_second.context['page_obj']),
+                         POSTS_ON_FINAL_PAGE)
 
 
 class FollowTest(TestCase):
@@ -341,3 +404,64 @@ class FollowTest(TestCase):
             reverse('posts:follow_index'),
         )
         self.assertNotIn(self.post, response.context['page_obj'].object_list)
+
+
+# Включая номер группы или автора для областей кеша страницы (кеш перед
+# запросом чист), а для ленты подписок — оценку её размера по счётчикам
+# авторов.
+FEED_PAGE_QUERIES = {
+    'posts:index': 4,
+    'posts:group_posts': 6,
+    'posts:profile': 7,
+    'posts:follow_index': 7,
+}
+
+
+class FeedQueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='queries-slug',
+            description='Тестовое описание группы',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'author_{count}_{i}')
+            Follow.objects.create(user=self.reader, author=author)
+            for post_author in (author, self.author):
+                post = Post.objects.create(text=f'Пост {i}', group=self.group,
+                                           author=post_author)
+                Comment.objects.create(post=post, author=self.reader,
+                                       text='Комментарий')
+
+    def urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_posts': reverse('posts:group_posts',
+                                         kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse('posts:profile',
+                                     kwargs={'username': self.author}),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов на страницу ленты не зависит от числа постов"""
+        for count in (1, 10):
+            self.add_posts(count)
+            for name, url in self.urls().items():
+                with self.subTest(url=url, posts=count):
+                    cache.clear()
+                    with self.assertNumQueries(FEED_PAGE_QUERIES[name]):
+                        response = self.reader_client.get(url)
+                    self.assertContains(response, 'Комментариев: 1')
@@ -0,0 +1,53 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+
+
+class WarmCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='warm-slug',
+                                         description='Описание')
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(3)]
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=cls.authors[1])
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def warm(self, **options):
+        out = StringIO()
+        call_command('warm_cache', workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_warm_pages_are_cache_hits(self):
+        """После прогрева ленты и популярные профили отдаются из кеша"""
+        output = self.warm(pages=2, profiles=1)
+        warmed = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.authors[1]}),
+        )
+        for url in warmed:
+            with self.subTest(url=url):
+                self.assertIn(url, output)
+                response = Client().get(url)
+                self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotIn(
+            reverse('posts:profile', kwargs={'username': self.authors[0]}),
+            output)
+
+    def test_budget_skips_remaining_urls(self):
+        """Исчерпанный бюджет времени останавливает прогрев"""
+        output = self.warm(budget=0)
+        self.assertIn('Прогрето страниц: 0', output)
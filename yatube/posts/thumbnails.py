@@ -0,0 +1,215 @@
+"""Миниатюры постов готовятся заранее в фоновом пуле потоков.
+
+Шаблоны не режут картинки во время запроса: пока миниатюры нет в
+хранилище sorl-thumbnail, показывается исходная картинка, а задача на
+нарезку ставится в пул.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.cache import LOCK_TIMEOUT
+
+from .models import Post
+from .signals import bump_post_scopes
+from .storage import post_images
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд не ставить в пул картинку, которую не удалось нарезать:
+# иначе её задача повторялась бы на каждой отрисовке карточки.
+RETRY_DELAY = 60 * 10
+
+# Картинка поста режется в нескольких ширинах для srcset и в двух
+# форматах: WebP для браузеров, которые его понимают, и JPEG для прочих.
+VARIANT_WIDTHS = (480, 768, 960)
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+ASPECT_RATIO = 339 / 960
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * ASPECT_RATIO)}'
+
+
+CARD_SIZES = tuple(
+    (variant_geometry(width),
+     {'crop': 'center', 'upscale': True, 'format': image_format})
+    for image_format in VARIANT_FORMATS for width in VARIANT_WIDTHS
+)
+
+# Страница поста показывает картинку целиком: варианты по ширине, без
+# кадрирования и увеличения.
+FULL_WIDTHS = (640, 1024, 1600)
+FULL_SIZES = tuple(
+    (str(width), {'upscale': False, 'format': image_format})
+    for image_format in VARIANT_FORMATS for width in FULL_WIDTHS
+)
+
+# Все размеры, в которых шаблоны показывают картинки постов.
+THUMBNAIL_SIZES = CARD_SIZES + FULL_SIZES
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из хранилища или None, если её ещё не нарезали.
+
+        Имя миниатюры считается так же, как в get_thumbnail.
+        """
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def _failed_key(name):
+    return f'thumbnail:{name}:failed'
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def generate(post_id):
+    """Нарезает все размеры картинки поста и обновляет его карточку.
+
+    Блокировка в кеше не даёт другим процессам резать ту же картинку
+    одновременно, если кеш общий (MEMCACHED_LOCATION), а внутри процесса
+    повторы отсекает _pending.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None or not post.image:
+        return
+    lock = f'thumbnail:{post.image.name}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        return
+    try:
+        for geometry, options in THUMBNAIL_SIZES:
+            get_thumbnail(post.image, geometry, **options)
+    except Exception:
+        cache.set(_failed_key(post.image.name), 1, RETRY_DELAY)
+        raise
+    finally:
+        cache.delete(lock)
+    Post.objects.filter(pk=post_id).update(updated=timezone.now())
+    bump_post_scopes(post.author_id, post.group_id)
+
+
+def regenerate(name, force=False):
+    """Нарезает миниатюры картинки по имени файла в хранилище.
+
+    С force сначала удаляет уже нарезанные миниатюры этой картинки.
+    Посты из базы не читает, поэтому подходит для пула процессов.
+    """
+    source = ImageFile(name, post_images)
+    if not source.exists():
+        raise FileNotFoundError(name)
+    if force:
+        default.kvstore.delete_thumbnails(source)
+    for geometry, options in THUMBNAIL_SIZES:
+        get_thumbnail(source, geometry, **options)
+
+
+def _generate(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Thumbnail generation failed for post %s', post_id)
+
+
+def _run(post_id):
+    try:
+        _generate(post_id)
+    finally:
+        with _lock:
+            _pending.discard(post_id)
+        connections.close_all()
+
+
+def _submit(post_id):
+    if not settings.THUMBNAIL_WORKERS:
+        _generate(post_id)
+        return
+    with _lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+    executor().submit(_run, post_id)
+
+
+def enqueue(post):
+    """Ставит нарезку в пул после фиксации транзакции с постом.
+
+    Картинку, которую недавно не удалось нарезать, не ставит до истечения
+    RETRY_DELAY.
+    """
+    if post.image and not cache.get(_failed_key(post.image.name)):
+        transaction.on_commit(lambda: _submit(post.pk))
+
+
+def srcset(thumbnails):
+    # Маленькая картинка без увеличения даёт одну ширину в нескольких
+    # вариантах, а в srcset ширины не должны повторяться.
+    widths = {thumbnail.width: thumbnail for thumbnail in thumbnails}
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for width, thumbnail in widths.items())
+
+
+def ready_variants(post, full=False):
+    """srcset картинки поста по форматам и самый крупный JPEG для src.
+
+    С full — варианты целой картинки для страницы поста, иначе
+    кадрированные для карточки. Пока нарезаны не все варианты, возвращает
+    None и ставит нарезку в пул.
+    """
+    if not post.image:
+        return None
+    variants = {image_format: [] for image_format in VARIANT_FORMATS}
+    try:
+        for geometry, options in FULL_SIZES if full else CARD_SIZES:
+            thumbnail = backend.get_ready_thumbnail(post.image, geometry,
+                                                    **options)
+            if thumbnail is None:
+                enqueue(post)
+                return None
+            variants[options['format']].append(thumbnail)
+    except Exception:
+        logger.exception('Thumbnail lookup failed for post %s', post.pk)
+        return None
+    return {
+        'webp': srcset(variants['WEBP']),
+        'jpeg': srcset(variants['JPEG']),
+        'src': variants['JPEG'][-1],
+    }
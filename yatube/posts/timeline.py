@@ -0,0 +1,187 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginator import POSTS_ON_PAGE
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def is_pulled(author_id):
+    """Посты популярных авторов не раскладываются, а читаются из Post."""
+    return AuthorStats.objects.filter(user_id=author_id, pulled=True).exists()
+
+
+def pulled_authors(user):
+    return Follow.objects.filter(
+        user=user, author__stats__pulled=True
+    ).values_list('author_id', flat=True)
+
+
+def _entries(user_ids, posts):
+    return [
+        TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id,
+                      pub_date=pub_date)
+        for user_id in user_ids
+        for post_id, author_id, pub_date in posts
+    ]
+
+
+def _save(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    _save(_entries(followers, [(post.id, post.author_id, post.pub_date)]))
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту пользователя все посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'author_id', 'pub_date'
+    )
+    _save(_entries([user_id], posts.iterator()))
+
+
+def window():
+    """Сколько последних постов автора видно в ленте по номерам страниц."""
+    return settings.FEED_OFFSET_PAGES * POSTS_ON_PAGE
+
+
+def _start_pulling(author_id):
+    if not AuthorStats.objects.filter(
+        user_id=author_id, pulled=False,
+        followers_count__gte=settings.FEED_PULL_FOLLOWERS_THRESHOLD,
+    ).update(pulled=True):
+        return
+    entries = TimelineEntry.objects.filter(author_id=author_id)
+    while True:
+        pks = list(entries.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        TimelineEntry.objects.filter(pk__in=pks).delete()
+
+
+def _stop_pulling(author_id):
+    # Пока автор читался напрямую, его посты в ленты не попадали.
+    # Раскладываются только последние window() постов: вся история
+    # автора на каждого подписчика — это слишком много строк.
+    if not AuthorStats.objects.filter(
+        user_id=author_id, pulled=True,
+        followers_count__lt=settings.FEED_PUSH_FOLLOWERS_THRESHOLD,
+    ).update(pulled=False):
+        return
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'author_id', 'pub_date')[:window()])
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    ).iterator()
+    batch = max(1, BATCH_SIZE // max(1, len(posts)))
+    while True:
+        user_ids = list(islice(followers, batch))
+        if not user_ids:
+            return
+        _save(_entries(user_ids, posts))
+
+
+def switch_mode(author_id):
+    """Переводит автора между раскладкой по лентам и чтением напрямую.
+
+    Условия проверяются заново на момент перевода, а сам перевод — это
+    условный UPDATE, поэтому повторные и одновременные вызовы безопасны.
+    """
+    _start_pulling(author_id)
+    _stop_pulling(author_id)
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_WORKERS,
+                thread_name_prefix='timeline',
+            )
+    return _executor
+
+
+def _switch(author_id):
+    try:
+        switch_mode(author_id)
+    except Exception:
+        logger.exception('Feed mode switch failed for author %s', author_id)
+
+
+def _run(author_id):
+    try:
+        _switch(author_id)
+    finally:
+        with _lock:
+            _pending.discard(author_id)
+        connections.close_all()
+
+
+def _submit(author_id):
+    with _lock:
+        if author_id in _pending:
+            return
+        _pending.add(author_id)
+    executor().submit(_run, author_id)
+
+
+def mismatched_authors():
+    """Авторы, чей режим разошёлся с числом подписчиков: с гистерезисом
+    между FEED_PULL_ и FEED_PUSH_FOLLOWERS_THRESHOLD."""
+    return AuthorStats.objects.filter(
+        Q(pulled=False,
+          followers_count__gte=settings.FEED_PULL_FOLLOWERS_THRESHOLD)
+        | Q(pulled=True,
+            followers_count__lt=settings.FEED_PUSH_FOLLOWERS_THRESHOLD)
+    ).values_list('user_id', flat=True)
+
+
+def enqueue_switch(author_id):
+    """Ставит перевод автора в пул после фиксации транзакции: удаление
+    или раскладка его постов не выполняются внутри запроса."""
+    if not mismatched_authors().filter(user_id=author_id).exists():
+        return
+    if not settings.TIMELINE_WORKERS:
+        switch_mode(author_id)
+        return
+    transaction.on_commit(lambda: _submit(author_id))
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def backfill(follows):
+    """Заполняет ленты по существующим подпискам, возвращает их число."""
+    count = 0
+    for user_id, author_id in follows.values_list('user_id', 'author_id'):
+        add_author(user_id, author_id)
+        count += 1
+    return count
@@ -0,0 +1,39 @@
+"""Приём загрузок с ограничением размера прямо при разборе запроса.
+
+Без него Django сначала складывает весь файл в память или во временный
+файл и только потом отдаёт его форме. LimitedUploadHandler стоит первым
+в FILE_UPLOAD_HANDLERS и перестаёт передавать куски дальше, как только
+файл превысит POST_IMAGE_MAX_BYTES: на диске и в памяти остаётся не
+больше предела, а форма получает пустой файл с настоящим размером и
+отклоняет его как слишком большой.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class TooLargeUpload(UploadedFile):
+    """Отброшенный файл: содержимого нет, size — сколько байт пришло."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return TooLargeUpload(self.file_name, self.content_type,
+                                  self.received)
+        return None
@@ -1,54 +1,73 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 
+from core.cache import cache_shared_page, cache_version
+
+from . import conditional, scopes, thumbnails
+from .counters import followed_posts_count, stats_for
+from .feed import FeedPaginator, follow_feed
 from .models import Post, Group, User, Follow
-from .paginator import paginate
+from .paginator import POSTS_ON_PAGE, paginate_by_cursor
+from .search import search_posts
 from posts.forms import CommentForm, PostForm
 
 
+@cache_shared_page('posts')
+@conditional.conditional_page('posts')
 def index(request):
-    post_list = Post.objects.all()
-    page_number = request.GET.get('page')
-    page_obj = paginate(post_list, page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = paginate_by_cursor(post_list, request,
+                                  count_scopes=('posts',))
     context = {
         'page_obj': page_obj,
+        'cache_version': cache_version('posts'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_shared_page(scopes.group)
+@conditional.conditional_page(scopes.group)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_number = request.GET.get('page')
-    page_obj = paginate(post_list, page_number)
+    post_list = group.posts.for_feed()
+    page_obj = paginate_by_cursor(post_list, request,
+                                  count_scopes=(f'group:{group.id}',))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_version': cache_version(f'group:{group.id}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_shared_page(scopes.author, scopes.profile)
+@conditional.conditional_page(scopes.author, scopes.profile)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    post_count = posts.count()
-    following = (request.user.is_authenticated
-                 and Follow.objects.filter(
-                     user=request.user, author=author
-                 ).exists()
-                 and request.user.username != username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    posts = author.posts.for_feed()
+    stats = stats_for(author)
     context = {
-        'page_obj': paginate(posts, request),
+        'page_obj': paginate_by_cursor(
+            posts, request, count_scopes=(f'author:{author.id}',),
+            count_estimate=lambda: stats.posts_count,
+        ),
         'author': author,
-        'post_count': post_count,
-        'following': following,
+        'post_count': stats.posts_count,
+        'stats': stats,
+        'cache_version': cache_version(f'author:{author.id}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_shared_page(scopes.post_author)
+@conditional.conditional_page(scopes.post_author)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    comments = post.comments.select_related('author')
     form = CommentForm()
     context = {
         'post': post,
@@ -58,6 +77,20 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_shared_page('posts')
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = Paginator(search_posts(query), POSTS_ON_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -65,6 +98,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue(post)
         return redirect('posts:profile', request.user.username)
 
     context = {
@@ -83,7 +117,9 @@ def post_edit(request, post_id):
     form = PostForm(request.POST or None, files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id)
     return render(request, template, {'form': form, 'is_edit': True})
 
@@ -102,11 +138,15 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_number = request.GET.get('page')
-    page_obj = paginate(posts, page_number)
+    page_obj = paginate_by_cursor(
+        follow_feed(request.user), request, paginator_class=FeedPaginator,
+        count_scopes=('posts', f'follow:{request.user.id}'),
+        count_estimate=lambda: followed_posts_count(request.user),
+    )
     context = {
         'page_obj': page_obj,
+        'cache_version': cache_version('posts',
+                                       f'follow:{request.user.id}'),
     }
     return render(request, 'posts/follow.html', context)
 
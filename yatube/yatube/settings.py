@@ -50,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.PageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +75,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.feed_cache_timeout',
             ],
         },
     },
@@ -145,3 +148,88 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Посты авторов, у которых подписчиков не меньше порога, не раскладываются
+# по лентам при публикации, а подмешиваются в ленту при чтении. Обратно
+# автор переходит, только опустившись ниже второго порога: подписка и
+# отписка на границе не гоняют его ленты туда и обратно.
+FEED_PULL_FOLLOWERS_THRESHOLD = 10000
+FEED_PUSH_FOLLOWERS_THRESHOLD = 9000
+
+# Потоков в пуле, который переводит авторов между режимами лент;
+# 0 — переводить прямо в запросе, без пула.
+TIMELINE_WORKERS = 1
+
+# Движок ленты подписок: 'hybrid' — таблица лент с подмешиванием
+# популярных авторов, 'kway' — слияние выборок по каждому автору.
+FOLLOW_FEED_ENGINE = 'hybrid'
+
+# Сколько страниц ленты подписок открывается по номеру (?page=N): каждый
+# источник ленты читается до конца страницы, дальше листают курсорами.
+FEED_OFFSET_PAGES = 20
+
+# Сколько раз должна повториться одна форма SQL-запроса за запрос,
+# чтобы QueryInspectorMiddleware и assert_query_budget сочли её N+1.
+QUERY_REPEAT_THRESHOLD = 3
+
+# Поколения, блокировки и кеш страниц должны быть общими для всех
+# процессов сайта, иначе запись в одном процессе не видна остальным.
+# Общий кеш — memcached по адресу из MEMCACHED_LOCATION (нужен
+# python-memcached); без него каждый процесс держит свой locmem.
+MEMCACHED_LOCATION = os.environ.get('MEMCACHED_LOCATION')
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Сколько секунд живут фрагменты лент в кеше шаблонов и целые страницы
+# (см. core.cache.cache_shared_page). С общим кешем устаревшие записи
+# отсекаются поколениями core.cache, и срок можно держать долгим.
+# В кеше процесса чужие записи не сдвигают его поколений, поэтому срок —
+# это и есть задержка, с которой процесс увидит новые посты.
+if MEMCACHED_LOCATION:
+    FEED_CACHE_TIMEOUT = 60 * 60 * 6
+    PAGE_CACHE_TIMEOUT = 60 * 60
+else:
+    FEED_CACHE_TIMEOUT = 20
+    PAGE_CACHE_TIMEOUT = 10
+
+# Начиная с этого числа постов пагинатор не пересчитывает COUNT после
+# каждой записи, а показывает «около N» по последнему известному числу
+# (не старше COUNT_MAX_STALENESS секунд) или по счётчикам авторов.
+APPROXIMATE_COUNT_THRESHOLD = 10000
+COUNT_MAX_STALENESS = 60 * 5
+
+# Потоков в пуле, который заранее режет миниатюры картинок постов;
+# 0 — резать сразу после фиксации транзакции, без пула.
+THUMBNAIL_WORKERS = 2
+
+# Хранилище ключей sorl-thumbnail с кешем в памяти процесса: сколько
+# записей держать и сколько секунд им доверять (см. posts.kvstore).
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_LOCAL_CACHE_SIZE = 1000
+THUMBNAIL_LOCAL_CACHE_TIMEOUT = 60
+
+# Ограничения на картинки постов (см. posts.ingest): размер файла,
+# число пикселей по заголовку и большая сторона после уменьшения.
+POST_IMAGE_MAX_BYTES = 15 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_QUALITY = 85
+
+# Загрузки тяжелее POST_IMAGE_MAX_BYTES отбрасываются ещё при разборе
+# запроса (см. posts.uploads).
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]